@@ -141,47 +141,50 @@ async def run_agent(thread_id: str, container_name: str, problem_file: str, thre
     await thread_manager.add_message(thread_id, prefill_message)
     await thread_manager.process_tool_calls_from_message(thread_id, prefill_message)
 
-    iteration = 0
-
-    while iteration < max_iterations:
-        iteration += 1
-
-        model_mapping = {
-            "sonnet": "anthropic/claude-3-5-sonnet-latest",
-            "haiku": "anthropic/claude-3-5-haiku-latest",
-            "deepseek": "deepseek/deepseek-chat",
-            "gpt-4o": "gpt-4o",
-            "qwen": "openrouter/qwen/qwen-2.5-coder-32b-instruct",
-        }
-        model_name_full = model_mapping.get(model_name, "anthropic/claude-3-5-sonnet-latest")  
-
-        response = await thread_manager.run_thread(
-            thread_id=thread_id,
-            system_message=system_message,
-            model_name=model_name_full,
-            temperature=0.0,
-            max_tokens=8192,
-            tool_choice="any",
-            execute_tools_async=False,
-            use_tools=True,
-            execute_model_tool_calls=True
-        )
-
-        print(f"Iteration {iteration}/{max_iterations}:")
-
-        await after_iteration()
-
-        # Check for 'submit' tool call in the assistant's last message
-        assistant_messages = await thread_manager.list_messages(thread_id, only_latest_assistant=True)
-        if assistant_messages:
-            last_assistant = assistant_messages[0]
-            tool_calls = last_assistant.get('tool_calls', [])
-            for tool_call in tool_calls:
-                if tool_call['function']['name'] == 'submit':
-                    print("Task completed via submit tool, stopping...")
-                    return
-
-    print(f"Agent completed after {iteration} iterations")
+    try:
+        iteration = 0
+
+        while iteration < max_iterations:
+            iteration += 1
+
+            model_mapping = {
+                "sonnet": "anthropic/claude-3-5-sonnet-latest",
+                "haiku": "anthropic/claude-3-5-haiku-latest",
+                "deepseek": "deepseek/deepseek-chat",
+                "gpt-4o": "gpt-4o",
+                "qwen": "openrouter/qwen/qwen-2.5-coder-32b-instruct",
+            }
+            model_name_full = model_mapping.get(model_name, "anthropic/claude-3-5-sonnet-latest")  
+
+            response = await thread_manager.run_thread(
+                thread_id=thread_id,
+                system_message=system_message,
+                model_name=model_name_full,
+                temperature=0.0,
+                max_tokens=8192,
+                tool_choice="any",
+                execute_tools_async=False,
+                use_tools=True,
+                execute_model_tool_calls=True
+            )
+
+            print(f"Iteration {iteration}/{max_iterations}:")
+
+            await after_iteration()
+
+            # Check for 'submit' tool call in the assistant's last message
+            assistant_messages = await thread_manager.list_messages(thread_id, only_latest_assistant=True)
+            if assistant_messages:
+                last_assistant = assistant_messages[0]
+                tool_calls = last_assistant.get('tool_calls', [])
+                for tool_call in tool_calls:
+                    if tool_call['function']['name'] == 'submit':
+                        print("Task completed via submit tool, stopping...")
+                        return
+
+        print(f"Agent completed after {iteration} iterations")
+    finally:
+        await thread_manager.close()
 
 if __name__ == "__main__":
     async def main():
@@ -206,4 +209,11 @@ if __name__ == "__main__":
             model_name=args.model_name
         )
 
+    # uvloop, when installed, services the docker exec pipes with less overhead
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
     asyncio.run(main())
\ No newline at end of file
@@ -151,87 +151,92 @@ async def run_agent(thread_id: str, container_name: str, problem_file: str, thre
     thread_manager.add_tool(RepositoryTools, container_name=container_name, state_manager=state_manager)
     repo_tool = RepositoryTools(container_name=container_name, state_manager=state_manager)
 
-    await repo_tool._init_workspace()
-
-    xml_examples = thread_manager.tool_registry.get_xml_examples()
-    xml_format = f"{json.dumps(xml_examples, indent=2)}"
-    system_message = {
-        "role": "system",
-        "content": system_prompt.format(xml_format=xml_format)
-    }
-    await thread_manager.add_to_history_only(thread_id, system_message)
-
-    iteration = 0
-    reminder_custom_test = False
-
-    while iteration < max_iterations:
-        try:
-            iteration += 1
-            stdout, _, _ = await repo_tool._bash_executor.execute('git diff')
-            await thread_manager.add_to_history_only(thread_id, {
-                "role": "git diff",
-                "content": f"{stdout if stdout else 'No changes'}"
-            })
-
-            await thread_manager.reset_messages(thread_id)
-
-            workspace = await repo_tool.format_workspace_xml()
+    try:
+        await repo_tool._init_workspace()
+
+        xml_examples = thread_manager.tool_registry.get_xml_examples()
+        xml_format = f"{json.dumps(xml_examples, indent=2)}"
+        system_message = {
+            "role": "system",
+            "content": system_prompt.format(xml_format=xml_format)
+        }
+        await thread_manager.add_to_history_only(thread_id, system_message)
+
+        iteration = 0
+        reminder_custom_test = False
+
+        while iteration < max_iterations:
+            try:
+                iteration += 1
+                stdout, _, _ = await repo_tool._bash_executor.execute('git diff')
+                await thread_manager.add_to_history_only(thread_id, {
+                    "role": "git diff",
+                    "content": f"{stdout if stdout else 'No changes'}"
+                })
+
+                await thread_manager.reset_messages(thread_id)
+
+                workspace = await repo_tool.format_workspace_xml()
             
-            await thread_manager.add_message(thread_id, {
-                "role": "user",
-                "content": user_prompt.format(
-                    problem_statement=problem_statement, 
-                    workspace=workspace,
-                    xml_format=xml_format,
+                await thread_manager.add_message(thread_id, {
+                    "role": "user",
+                    "content": user_prompt.format(
+                        problem_statement=problem_statement, 
+                        workspace=workspace,
+                        xml_format=xml_format,
+                    )
+                })
+
+                # Add continuation prompt for iterations after the first
+                temporary_message = None
+                if iteration > 1:
+                    if reminder_custom_test:
+                        temporary_message = {
+                            "role": "user",
+                            "content": "\n\n# **IMPORTANT**: Have you created and run new tests specified for this PR? If not, please do so now."
+                        }
+                        reminder_custom_test = False
+
+                response = await thread_manager.run_thread(
+                    thread_id=thread_id,
+                    system_message=system_message,
+                    model_name=model_name,
+                    temperature=0.0,
+                    max_tokens=8096,
+                    tool_choice="any",
+                    native_tool_calling=False,
+                    xml_tool_calling=True,
+                    parallel_tool_execution=False,
+                    temporary_message=temporary_message, 
+                    stop_sequences=["</EXECUTE_ACTIONS>"]
                 )
-            })
-
-            # Add continuation prompt for iterations after the first
-            temporary_message = None
-            if iteration > 1:
-                if reminder_custom_test:
-                    temporary_message = {
-                        "role": "user",
-                        "content": "\n\n# **IMPORTANT**: Have you created and run new tests specified for this PR? If not, please do so now."
-                    }
-                    reminder_custom_test = False
-
-            response = await thread_manager.run_thread(
-                thread_id=thread_id,
-                system_message=system_message,
-                model_name=model_name,
-                temperature=0.0,
-                max_tokens=8096,
-                tool_choice="any",
-                native_tool_calling=False,
-                xml_tool_calling=True,
-                parallel_tool_execution=False,
-                temporary_message=temporary_message, 
-                stop_sequences=["</EXECUTE_ACTIONS>"]
-            )
-
-            assistant_messages = await thread_manager.list_messages(thread_id, only_latest_assistant=True)
-            if assistant_messages:
-                last_assistant = assistant_messages[0]['content']
-                try:
-                    if "SUBMIT_FINAL_SOLUTION_ONLY_IF_ALL_TESTS_PASS" in last_assistant:
-                        if iteration > 5:
-                            print("Task completed via SUBMIT_FINAL_SOLUTION_ONLY_IF_ALL_TESTS_PASS tool, stopping...")
-                            agentops_session.end_session()
-                            return
-                        else:
-                            reminder_custom_test = True
-                except Exception as e:
-                    print(f"Error parsing XML response: {str(e)}")
-                    continue
-
-        except Exception as e:
-            print(f"Error in iteration {iteration}: {str(e)}")
-            break
-
-    print(f"Agent completed after {iteration} iterations")
-
-    agentops_session.end_session()
+
+                assistant_messages = await thread_manager.list_messages(thread_id, only_latest_assistant=True)
+                if assistant_messages:
+                    last_assistant = assistant_messages[0]['content']
+                    try:
+                        if "SUBMIT_FINAL_SOLUTION_ONLY_IF_ALL_TESTS_PASS" in last_assistant:
+                            if iteration > 5:
+                                print("Task completed via SUBMIT_FINAL_SOLUTION_ONLY_IF_ALL_TESTS_PASS tool, stopping...")
+                                agentops_session.end_session()
+                                return
+                            else:
+                                reminder_custom_test = True
+                    except Exception as e:
+                        print(f"Error parsing XML response: {str(e)}")
+                        continue
+
+            except Exception as e:
+                print(f"Error in iteration {iteration}: {str(e)}")
+                break
+
+        print(f"Agent completed after {iteration} iterations")
+
+        agentops_session.end_session()
+    finally:
+        # repo_tool isn't registered; closing the thread manager shuts down the registered tools
+        await repo_tool.aclose()
+        await thread_manager.close()
 
 if __name__ == "__main__":
     async def main():
@@ -266,4 +271,11 @@ if __name__ == "__main__":
             model_name=model_name
         )
 
+    # uvloop, when installed, services the docker exec pipes with less overhead
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
     asyncio.run(main())
@@ -1,10 +1,13 @@
 import json
 import os
 import logging
-from typing import Any
+from typing import Any, Callable, List, Optional, Tuple
 from asyncio import Lock
 from contextlib import asynccontextmanager
 
+class StateManagerError(Exception):
+    """Raised when the state store file cannot be read or written."""
+
 class StateManager:
     """
     Manages persistent state storage for AgentPress components.
@@ -44,21 +47,27 @@ class StateManager:
             dict: The current state store contents
             
         Raises:
-            Exception: If there are errors reading from or writing to the store file
+            StateManagerError: If there are errors reading from or writing to the store file
         """
         try:
             # Read current state
-            if os.path.exists(self.store_file):
-                with open(self.store_file, 'r') as f:
-                    store = json.load(f)
-            else:
-                store = {}
+            try:
+                if os.path.exists(self.store_file):
+                    with open(self.store_file, 'r') as f:
+                        store = json.load(f)
+                else:
+                    store = {}
+            except (OSError, ValueError) as e:
+                raise StateManagerError(f"Could not read state store {self.store_file}: {e}") from e
             
             yield store
             
             # Write updated state
-            with open(self.store_file, 'w') as f:
-                json.dump(store, f, indent=2)
+            try:
+                with open(self.store_file, 'w') as f:
+                    json.dump(store, f, indent=2)
+            except (OSError, TypeError, ValueError) as e:
+                raise StateManagerError(f"Could not write state store {self.store_file}: {e}") from e
             logging.debug("Store saved successfully")
         except Exception as e:
             logging.error("Error in store operation", exc_info=True)
@@ -88,6 +97,103 @@ class StateManager:
                     logging.error(f'Error in set: {str(e)}')
                     raise
 
+    async def update(self, key: str, mutator: Callable[[Any], Any]) -> Any:
+        """
+        Modify the data for a key in place with a single load and store.
+        
+        Args:
+            key (str): Simple string key like "config" or "settings"
+            mutator (Callable): Called with the stored data; changes it in place
+            
+        Returns:
+            Any: Whatever the mutator returns
+            
+        Raises:
+            StateManagerError: If no data is stored for the key, or the store can't be read or written
+            Exception: If the mutator fails
+        """
+        async with self.lock:
+            async with self.store_scope() as store:
+                data = store.get(key)
+                if data is None:
+                    raise StateManagerError(f"No data stored for key: {key}")
+                result = mutator(data)
+                logging.info(f'Updated store key: {key}')
+                return result
+
+    async def set_path(self, path: Tuple[str, ...], value: Any) -> Any:
+        """
+        Store a value nested inside the data of a key, e.g. ("workspace", "implementation_trials", "A").
+        
+        The key must already hold data; missing dictionaries below it are created.
+        
+        Args:
+            path (tuple): Key followed by the nested dictionary keys
+            value (Any): Any JSON-serializable data
+            
+        Returns:
+            Any: The stored value
+            
+        Raises:
+            StateManagerError: If no data is stored for the key, or the store can't be read or written
+        """
+        async with self.lock:
+            async with self.store_scope() as store:
+                parent = self._resolve_parent(store, path)
+                parent[path[-1]] = value
+                logging.info(f'Updated store path: {path}')
+                return value
+
+    async def append(self, path: Tuple[str, ...], value: Any, max_length: Optional[int] = None):
+        """
+        Append a value to a list nested inside the data of a key, e.g. ("workspace", "latest_failures").
+        
+        The key must already hold data; missing dictionaries below it and a missing list are created.
+        
+        Args:
+            path (tuple): Key followed by the nested dictionary keys
+            value (Any): Any JSON-serializable data
+            max_length (int, optional): Oldest entries are dropped to keep the list at this length
+            
+        Raises:
+            StateManagerError: If no data is stored for the key, or the store can't be read or written
+        """
+        await self.extend(path, [value], max_length)
+
+    async def extend(self, path: Tuple[str, ...], values: List[Any], max_length: Optional[int] = None):
+        """
+        Append several values to a nested list at once, see append.
+        
+        Args:
+            path (tuple): Key followed by the nested dictionary keys
+            values (list): JSON-serializable values, in order
+            max_length (int, optional): Oldest entries are dropped to keep the list at this length
+            
+        Raises:
+            StateManagerError: If no data is stored for the key, or the store can't be read or written
+        """
+        async with self.lock:
+            async with self.store_scope() as store:
+                entries = self._resolve_parent(store, path).setdefault(path[-1], [])
+                entries.extend(values)
+                if max_length is not None and len(entries) > max_length:
+                    del entries[:len(entries) - max_length]
+                logging.info(f'Appended to store path: {path}')
+
+    @staticmethod
+    def _resolve_parent(store: dict, path: Tuple[str, ...]) -> dict:
+        """Return the dictionary holding the last key of path, creating missing ones below the key."""
+        if len(path) == 1:
+            return store
+        parent = store.get(path[0])
+        if parent is None:
+            raise StateManagerError(f"No data stored for key: {path[0]}")
+        for key in path[1:-1]:
+            if parent.get(key) is None:
+                parent[key] = {}
+            parent = parent[key]
+        return parent
+
     async def get(self, key: str) -> Any:
         """
         Get data for a key.
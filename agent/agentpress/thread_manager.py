@@ -9,12 +9,15 @@ This module provides comprehensive conversation management, including:
 - Error handling and cleanup
 """
 
-import json
+import asyncio
+import base64
+import hashlib
 import logging
 import os
 import uuid
-from typing import List, Dict, Any, Optional, Type, Union, AsyncGenerator
-import uuid
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Type, Union, AsyncGenerator, Iterator, Tuple
+import orjson
 from agentpress.llm import make_llm_api_call
 from agentpress.tool import Tool, ToolResult
 from agentpress.tool_registry import ToolRegistry
@@ -28,6 +31,96 @@ from agentpress.standard_tool_parser import StandardToolParser
 from agentpress.standard_tool_executor import StandardToolExecutor
 from agentpress.standard_results_adder import StandardResultsAdder
 
+# Idle window after the last change before a thread snapshot is written
+FLUSH_DELAY = 0.02
+# Number of unflushed changes after which a thread snapshot is written immediately
+MAX_PENDING_CHANGES = 32
+# Interval at which appended history entries are fsynced as one batch
+FSYNC_INTERVAL = 0.1
+# Number of inlined image data URLs kept in memory for reuse across LLM calls
+IMAGE_URL_CACHE_SIZE = 64
+# Fraction of the context token limit above which older messages are summarized
+SUMMARY_THRESHOLD = 0.8
+# Number of most recent messages always sent verbatim when summarizing
+SUMMARY_KEEP_LAST = 20
+# Characters of each older message kept in the summary
+SUMMARY_EXCERPT_CHARS = 200
+
+def _write_all(fd: int, payload: bytes):
+    """Write a fully built payload to a file descriptor, retrying on short writes."""
+    view = memoryview(payload)
+    while view:
+        view = view[os.write(fd, view):]
+
+def _read_file(path: str) -> bytes:
+    """Read a whole file with raw reads sized from fstat, bypassing file object buffering."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        chunks = []
+        remaining = os.fstat(fd).st_size
+        while True:
+            chunk = os.read(fd, max(remaining, 1))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+    finally:
+        os.close(fd)
+
+def _fsync_all(fds):
+    """Flush a batch of file descriptors to stable storage."""
+    for fd in fds:
+        os.fsync(fd)
+
+def _message_text(message: Dict[str, Any]) -> str:
+    """Return the text parts of a message's content."""
+    content = message.get('content')
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(item.get('text', '') for item in content if item.get('type') == 'text')
+    return ""
+
+def _estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Roughly estimate the token count of messages at four characters per token."""
+    return sum(len(_message_text(message)) for message in messages) // 4
+
+def _find_last_assistant_with_toolcalls(messages: List[Dict[str, Any]]) -> Optional[Tuple[int, int, int]]:
+    """Locate the last assistant message with tool calls in a single backward pass.
+    
+    Returns:
+        Optional[Tuple[int, int, int]]: Index of the assistant message, its number of
+        tool calls and the number of tool responses after it, or None if there is none
+    """
+    tool_response_count = 0
+    for i in range(len(messages) - 1, -1, -1):
+        message = messages[i]
+        role = message['role']
+        if role == 'tool':
+            tool_response_count += 1
+        elif role == 'assistant' and 'tool_calls' in message:
+            return i, len(message['tool_calls']), tool_response_count
+    return None
+
+def _atomic_write(path: str, payload: bytes):
+    """Write a payload to a temporary file and rename it over path.
+    
+    Readers see either the previous or the new contents of path, never a
+    partially written file.
+    """
+    tmp_path = path + ".tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_TRUNC | os.O_CREAT, 0o644)
+    try:
+        _write_all(fd, payload)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+
+def _write_snapshot(path: str, messages: List[Dict[str, Any]]):
+    """Serialize a thread snapshot and atomically replace its thread file."""
+    _atomic_write(path, orjson.dumps({"messages": messages}))
+
 class ThreadManager:
     """Manages conversation threads with LLM models and tool execution.
     
@@ -39,6 +132,16 @@ class ThreadManager:
         threads_dir (str): Directory for storing thread files
         tool_registry (ToolRegistry): Registry for managing available tools
         
+    Notes:
+        Image attachments are stored once under <threads_dir>/<thread_id>/images
+        and referenced from messages; they are inlined only in the payload sent
+        to the LLM. Thread messages are cached in memory once loaded, so reads never touch
+        disk after the first access. Changes are coalesced and written to the
+        thread file by a background worker after a short idle window; call flush() to force pending
+        writes. The history file is a newline-delimited JSON log that is only
+        ever appended to; appended entries are fsynced in batches every
+        FSYNC_INTERVAL seconds rather than after each write.
+        
     Methods:
         add_tool: Register a tool with optional function filtering
         create_thread: Create a new conversation thread
@@ -47,11 +150,12 @@ class ThreadManager:
         run_thread: Execute a conversation thread with LLM
     """
 
-    def __init__(self, threads_dir: str = "/home/nightfury/projects/test/new_agent_version/threads"):
+    def __init__(self, threads_dir: str = "/home/nightfury/projects/test/new_agent_version/threads", parallel_tools: bool = True):
         """Initialize ThreadManager.
         
         Args:
             threads_dir: Directory to store thread files
+            parallel_tools: Whether add_message_and_run_tools executes tool calls concurrently
             
         Notes:
             Creates the threads directory if it doesn't exist
@@ -59,7 +163,18 @@ class ThreadManager:
         self.threads_dir = threads_dir
         self.tool_registry = ToolRegistry()
         os.makedirs(self.threads_dir, exist_ok=True)
-        self.tool_executor = StandardToolExecutor(parallel=False)
+        self.tool_executor = StandardToolExecutor(parallel=parallel_tools)
+        self._thread_cache: Dict[str, List[Dict[str, Any]]] = {}
+        self._history_fd: Dict[str, int] = {}
+        self._dirty: Dict[str, int] = {}
+        self._flush_handles: Dict[str, asyncio.TimerHandle] = {}
+        self._flush_locks: Dict[str, asyncio.Lock] = {}
+        self._snapshot_queue: asyncio.Queue = asyncio.Queue()
+        self._queued_snapshots: set = set()
+        self._snapshot_worker_task: Optional[asyncio.Task] = None
+        self._unsynced_history: set = set()
+        self._fsync_task: Optional[asyncio.Task] = None
+        self._image_url_cache: OrderedDict = OrderedDict()
 
     def add_tool(self, tool_class: Type[Tool], function_names: Optional[List[str]] = None, **kwargs):
         """Add a tool to the ThreadManager.
@@ -85,22 +200,195 @@ class ThreadManager:
             IOError: If thread file creation fails
             
         Notes:
-            Creates new thread file and history file with empty messages lists
+            Creates new thread file with an empty messages list and an empty history log
         """
         thread_id = str(uuid.uuid4())
-        thread_path = os.path.join(self.threads_dir, f"{thread_id}.json")
-        history_path = os.path.join(self.threads_dir, f"{thread_id}_history.json")
-        
-        empty_data = {"messages": []}
         
-        # Create both files with empty message lists
-        with open(thread_path, 'w') as f:
-            json.dump(empty_data, f)
-        with open(history_path, 'w') as f:
-            json.dump(empty_data, f)
+        # Create the thread file with an empty message list and an empty history log
+        self._thread_cache[thread_id] = []
+        _write_snapshot(self._thread_path(thread_id), [])
+        self._history_file(thread_id)
             
         return thread_id
 
+    def _thread_path(self, thread_id: str) -> str:
+        return os.path.join(self.threads_dir, f"{thread_id}.json")
+
+    def _history_path(self, thread_id: str) -> str:
+        return os.path.join(self.threads_dir, f"{thread_id}_history.ndjson")
+
+    def _load_thread(self, thread_id: str) -> List[Dict[str, Any]]:
+        """Return the cached message list of a thread, loading it from disk on first access.
+        
+        Raises:
+            FileNotFoundError: If thread doesn't exist
+        """
+        messages = self._thread_cache.get(thread_id)
+        if messages is None:
+            messages = orjson.loads(_read_file(self._thread_path(thread_id)))["messages"]
+            self._thread_cache[thread_id] = messages
+        return messages
+
+    def _mark_dirty(self, thread_id: str):
+        """Schedule a coalesced snapshot write for a thread after its cache changed.
+        
+        Every change pushes the write back by FLUSH_DELAY, so a burst of changes
+        results in one write. Once MAX_PENDING_CHANGES accumulate the snapshot
+        is written right away to bound what an unexpected exit can lose.
+        """
+        pending = self._dirty.get(thread_id, 0) + 1
+        self._dirty[thread_id] = pending
+        handle = self._flush_handles.pop(thread_id, None)
+        if handle is not None:
+            handle.cancel()
+        if pending >= MAX_PENDING_CHANGES:
+            self._schedule_flush(thread_id)
+        else:
+            loop = asyncio.get_running_loop()
+            self._flush_handles[thread_id] = loop.call_later(FLUSH_DELAY, self._schedule_flush, thread_id)
+
+    def _schedule_flush(self, thread_id: str):
+        """Queue a snapshot write for a thread on the snapshot worker.
+        
+        A thread that is already queued is not queued again; its write picks
+        up every change made until the worker gets to it.
+        """
+        self._flush_handles.pop(thread_id, None)
+        if thread_id in self._queued_snapshots:
+            return
+        self._queued_snapshots.add(thread_id)
+        self._snapshot_queue.put_nowait(thread_id)
+        if self._snapshot_worker_task is None or self._snapshot_worker_task.done():
+            self._snapshot_worker_task = asyncio.get_running_loop().create_task(self._snapshot_worker())
+
+    async def _snapshot_worker(self):
+        """Write queued thread snapshots one at a time for the lifetime of the manager."""
+        while True:
+            thread_id = await self._snapshot_queue.get()
+            self._queued_snapshots.discard(thread_id)
+            try:
+                await self._flush_thread(thread_id)
+            except Exception:
+                # Already logged; the thread stays dirty and is retried on the next flush
+                pass
+            finally:
+                self._snapshot_queue.task_done()
+
+    async def _flush_thread(self, thread_id: str):
+        """Write a thread snapshot now if it has unflushed changes.
+        
+        Serialization and the write run in a worker thread so large threads
+        don't stall the event loop. Writes of the same thread are serialized.
+        """
+        handle = self._flush_handles.pop(thread_id, None)
+        if handle is not None:
+            handle.cancel()
+        lock = self._flush_locks.setdefault(thread_id, asyncio.Lock())
+        async with lock:
+            pending = self._dirty.pop(thread_id, None)
+            if not pending:
+                return
+            # Shallow copy so messages appended meanwhile don't race the worker
+            messages = list(self._thread_cache[thread_id])
+            try:
+                await asyncio.to_thread(_write_snapshot, self._thread_path(thread_id), messages)
+            except Exception as e:
+                # Keep the thread dirty so the next flush retries the write
+                self._dirty[thread_id] = self._dirty.get(thread_id, 0) + pending
+                logging.error(f"Failed to write thread {thread_id}: {e}")
+                raise
+
+    async def flush(self, thread_id: Optional[str] = None):
+        """Write pending changes of a thread, or of all threads, to disk.
+        
+        Args:
+            thread_id: ID of the thread to flush; flushes every thread if None
+        """
+        if thread_id is not None:
+            thread_ids = [thread_id]
+        else:
+            thread_ids = list(self._dirty.keys() | self._flush_locks.keys())
+        for pending_thread_id in thread_ids:
+            await self._flush_thread(pending_thread_id)
+
+    def _history_file(self, thread_id: str) -> int:
+        """Return the append-mode descriptor of a thread's history log, opening it once per thread."""
+        fd = self._history_fd.get(thread_id)
+        if fd is None:
+            fd = os.open(self._history_path(thread_id), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._history_fd[thread_id] = fd
+        return fd
+
+    def _append_history(self, thread_id: str, *messages_data: Dict[str, Any]) -> List[bytes]:
+        """Append messages as JSON lines to the history log of a thread in a single write.
+        
+        Returns:
+            List[bytes]: The encoded messages, so callers can cache copies without encoding again
+        """
+        fd = self._history_file(thread_id)
+        encoded = [orjson.dumps(message_data) for message_data in messages_data]
+        _write_all(fd, b"".join([line + b"\n" for line in encoded]))
+        self._unsynced_history.add(fd)
+        if self._fsync_task is None or self._fsync_task.done():
+            self._fsync_task = asyncio.get_running_loop().create_task(self._sync_history())
+        return encoded
+
+    async def _sync_history(self):
+        """Fsync history logs written since the last batch until no unsynced writes remain."""
+        while self._unsynced_history:
+            await asyncio.sleep(FSYNC_INTERVAL)
+            fds, self._unsynced_history = self._unsynced_history, set()
+            try:
+                await asyncio.to_thread(_fsync_all, fds)
+            except asyncio.CancelledError:
+                self._unsynced_history |= fds
+                raise
+            except OSError as e:
+                logging.error(f"Failed to sync history logs: {e}")
+
+    def iter_history(self, thread_id: str) -> Iterator[Dict[str, Any]]:
+        """Stream the history log of a thread one message at a time.
+        
+        Args:
+            thread_id: ID of the thread whose history to read
+            
+        Yields:
+            Dict[str, Any]: History entries in the order they were appended
+            
+        Raises:
+            FileNotFoundError: If thread doesn't exist
+        """
+        with open(self._history_path(thread_id), 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield orjson.loads(line)
+
+    async def close(self):
+        """Flush pending thread changes, close all history logs opened by this manager and shut down the tools."""
+        await self.flush()
+        await self.tool_registry.aclose()
+        if self._snapshot_worker_task is not None:
+            self._snapshot_worker_task.cancel()
+            try:
+                await self._snapshot_worker_task
+            except asyncio.CancelledError:
+                pass
+            self._snapshot_worker_task = None
+        self._snapshot_queue = asyncio.Queue()
+        self._queued_snapshots.clear()
+        if self._fsync_task is not None:
+            self._fsync_task.cancel()
+            try:
+                await self._fsync_task
+            except asyncio.CancelledError:
+                pass
+            self._fsync_task = None
+        _fsync_all(self._unsynced_history)
+        self._unsynced_history.clear()
+        for fd in self._history_fd.values():
+            os.close(fd)
+        self._history_fd.clear()
+
     async def add_message(self, thread_id: str, message_data: Dict[str, Any], images: Optional[List[Dict[str, Any]]] = None):
         """Add a message to an existing thread.
         
@@ -116,35 +404,27 @@ class ThreadManager:
         Notes:
             - Handles cleanup of incomplete tool calls
             - Supports both text and image content
-            - Converts ToolResult instances to strings
+            - Converts ToolResult content to a string
         """
         logging.info(f"Adding message to thread {thread_id} with images: {images}")
-        thread_path = os.path.join(self.threads_dir, f"{thread_id}.json")
-        history_path = os.path.join(self.threads_dir, f"{thread_id}_history.json")
         
         try:
-            with open(thread_path, 'r') as f:
-                thread_data = json.load(f)
-            
-            messages = thread_data["messages"]
+            messages = self._load_thread(thread_id)
             
             # Handle cleanup of incomplete tool calls
             if message_data['role'] == 'user':
-                last_assistant_index = next((i for i in reversed(range(len(messages))) 
-                    if messages[i]['role'] == 'assistant' and 'tool_calls' in messages[i]), None)
+                last_tool_calls = _find_last_assistant_with_toolcalls(messages)
                 
-                if last_assistant_index is not None:
-                    tool_call_count = len(messages[last_assistant_index]['tool_calls'])
-                    tool_response_count = sum(1 for msg in messages[last_assistant_index+1:] 
-                                           if msg['role'] == 'tool')
+                if last_tool_calls is not None:
+                    _, tool_call_count, tool_response_count = last_tool_calls
                     
                     if tool_call_count != tool_response_count:
-                        await self.cleanup_incomplete_tool_calls(thread_id)
+                        await self.cleanup_incomplete_tool_calls(thread_id, messages)
 
-            # Convert ToolResult instances to strings
-            for key, value in message_data.items():
-                if isinstance(value, ToolResult):
-                    message_data[key] = str(value)
+            # Convert a ToolResult passed as content to a string
+            content = message_data.get('content')
+            if type(content) is ToolResult:
+                message_data['content'] = str(content)
 
             # Handle image attachments
             if images:
@@ -154,36 +434,73 @@ class ThreadManager:
                     message_data['content'] = []
 
                 for image in images:
-                    image_content = {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:{image['content_type']};base64,{image['base64']}",
-                            "detail": "high"
-                        }
-                    }
-                    message_data['content'].append(image_content)
-
-            messages.append(message_data)
-            thread_data["messages"] = messages
-            
-            with open(thread_path, 'w') as f:
-                json.dump(thread_data, f)
+                    message_data['content'].append(self._store_image(thread_id, image))
 
-            # Write to history file
-            try:
-                with open(history_path, 'r') as f:
-                    history_data = json.load(f)
-            except FileNotFoundError:
-                history_data = {"messages": []}
-            history_data["messages"].append(message_data)
-            with open(history_path, 'w') as f:
-                json.dump(history_data, f)
+            # Cache a copy, so later changes to the caller's dict don't alter the thread
+            encoded, = self._append_history(thread_id, message_data)
+            messages.append(orjson.loads(encoded))
+            self._mark_dirty(thread_id)
             
             logging.info(f"Message added to thread {thread_id} and history: {message_data}")
         except Exception as e:
             logging.error(f"Failed to add message to thread {thread_id}: {e}")
             raise e
 
+    def _store_image(self, thread_id: str, image: Dict[str, Any]) -> Dict[str, Any]:
+        """Write an image attachment next to the thread once and return a reference to it.
+        
+        Images are keyed by a hash of their content, so the same image attached
+        repeatedly is stored only once. The reference is turned back into an
+        inline data URL by _materialize_images before messages are sent to the LLM.
+        """
+        digest = hashlib.sha256(image['base64'].encode()).hexdigest()[:16]
+        images_dir = os.path.join(self.threads_dir, thread_id, "images")
+        path = os.path.join(images_dir, f"{digest}.bin")
+        if not os.path.exists(path):
+            os.makedirs(images_dir, exist_ok=True)
+            _atomic_write(path, base64.b64decode(image['base64']))
+        return {
+            "type": "image_ref",
+            "path": path,
+            "content_type": image['content_type'],
+            "detail": "high"
+        }
+
+    def _materialize_images(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return messages with stored image references inlined as base64 data URLs.
+        
+        Messages without image references are passed through as is; messages
+        that have them are copied so the thread itself keeps the references.
+        """
+        materialized = []
+        for message in messages:
+            content = message.get('content')
+            if isinstance(content, list) and any(item.get('type') == 'image_ref' for item in content):
+                message = {**message, 'content': [self._inline_image(item) if item.get('type') == 'image_ref' else item for item in content]}
+            materialized.append(message)
+        return materialized
+
+    def _inline_image(self, image_ref: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the image_url entry for a stored image, reusing recently built data URLs."""
+        path = image_ref['path']
+        url = self._image_url_cache.get(path)
+        if url is None:
+            with open(path, 'rb') as f:
+                encoded = base64.b64encode(f.read()).decode()
+            url = f"data:{image_ref['content_type']};base64,{encoded}"
+            self._image_url_cache[path] = url
+            if len(self._image_url_cache) > IMAGE_URL_CACHE_SIZE:
+                self._image_url_cache.popitem(last=False)
+        else:
+            self._image_url_cache.move_to_end(path)
+        return {
+            "type": "image_url",
+            "image_url": {
+                "url": url,
+                "detail": image_ref.get('detail', "high")
+            }
+        }
+
     async def list_messages(
         self, 
         thread_id: str, 
@@ -205,13 +522,11 @@ class ThreadManager:
         Notes:
             - Returns empty list if thread doesn't exist
             - Filters can be combined for different views of the conversation
+            - only_latest_assistant scans the cached thread backwards and stops
+              at the first assistant message, without copying the thread
         """
-        thread_path = os.path.join(self.threads_dir, f"{thread_id}.json")
-        
         try:
-            with open(thread_path, 'r') as f:
-                thread_data = json.load(f)
-            messages = thread_data["messages"]
+            messages = self._load_thread(thread_id)
             
             if only_latest_assistant:
                 for msg in reversed(messages):
@@ -219,30 +534,32 @@ class ThreadManager:
                         return [msg]
                 return []
             
-            filtered_messages = messages
-            
+            # Each branch builds a new list so callers never mutate the cached thread
             if hide_tool_msgs:
                 filtered_messages = [
-                    {k: v for k, v in msg.items() if k != 'tool_calls'}
-                    for msg in filtered_messages
+                    msg if 'tool_calls' not in msg else {k: v for k, v in msg.items() if k != 'tool_calls'}
+                    for msg in messages
                     if msg.get('role') != 'tool'
+                    and (not regular_list or msg.get('role') in {'system', 'assistant', 'user'})
                 ]
-        
-            if regular_list:
+            elif regular_list:
                 filtered_messages = [
-                    msg for msg in filtered_messages
-                    if msg.get('role') in ['system', 'assistant', 'tool', 'user']
+                    msg for msg in messages
+                    if msg.get('role') in {'system', 'assistant', 'tool', 'user'}
                 ]
+            else:
+                filtered_messages = list(messages)
             
             return filtered_messages
         except FileNotFoundError:
             return []
 
-    async def cleanup_incomplete_tool_calls(self, thread_id: str):
+    async def cleanup_incomplete_tool_calls(self, thread_id: str, messages: Optional[List[Dict[str, Any]]] = None):
         """Clean up incomplete tool calls in a thread.
         
         Args:
             thread_id: ID of the thread to clean up
+            messages: The thread's message list, if the caller has already loaded it
             
         Returns:
             bool: True if cleanup was performed, False otherwise
@@ -251,18 +568,17 @@ class ThreadManager:
             - Adds failure results for incomplete tool calls
             - Maintains thread consistency after interruptions
         """
-        messages = await self.list_messages(thread_id)
-        last_assistant_message = next((m for m in reversed(messages) 
-            if m['role'] == 'assistant' and 'tool_calls' in m), None)
+        if messages is None:
+            messages = self._load_thread(thread_id)
+        last_tool_calls = _find_last_assistant_with_toolcalls(messages)
 
-        if last_assistant_message:
-            tool_calls = last_assistant_message.get('tool_calls', [])
-            tool_responses = [m for m in messages[messages.index(last_assistant_message)+1:] 
-                            if m['role'] == 'tool']
+        if last_tool_calls is not None:
+            assistant_index, tool_call_count, tool_response_count = last_tool_calls
 
-            if len(tool_calls) != len(tool_responses):
+            if tool_call_count != tool_response_count:
+                tool_calls = messages[assistant_index]['tool_calls']
                 failed_tool_results = []
-                for tool_call in tool_calls[len(tool_responses):]:
+                for tool_call in tool_calls[tool_response_count:]:
                     failed_tool_result = {
                         "role": "tool",
                         "tool_call_id": tool_call['id'],
@@ -271,12 +587,8 @@ class ThreadManager:
                     }
                     failed_tool_results.append(failed_tool_result)
 
-                assistant_index = messages.index(last_assistant_message)
                 messages[assistant_index+1:assistant_index+1] = failed_tool_results
-
-                thread_path = os.path.join(self.threads_dir, f"{thread_id}.json")
-                with open(thread_path, 'w') as f:
-                    json.dump({"messages": messages}, f)
+                self._mark_dirty(thread_id)
 
                 return True
         return False
@@ -300,7 +612,9 @@ class ThreadManager:
         tool_executor: Optional[ToolExecutorBase] = None,
         results_adder: Optional[ResultsAdderBase] = None,
         agentops_session: Any = None,  # Add agentops_session parameter
-        stop_sequences: List[str] = None  # Updated parameter
+        stop_sequences: List[str] = None,  # Updated parameter
+        context_token_limit: Optional[int] = None,
+        context_window_messages: Optional[int] = None
     ) -> Union[Dict[str, Any], AsyncGenerator]:
         """Run a conversation thread with specified parameters.
         
@@ -321,6 +635,10 @@ class ThreadManager:
             tool_parser: Custom tool parser implementation
             tool_executor: Custom tool executor implementation
             results_adder: Custom results adder implementation
+            context_token_limit: Context size of the model in tokens; if set, older
+                messages are summarized once the prompt nears this limit
+            context_window_messages: If set, only the most recent messages, plus any
+                earlier system messages, are sent to the LLM
             
         Returns:
             Union[Dict[str, Any], AsyncGenerator]: Response or stream
@@ -350,6 +668,8 @@ class ThreadManager:
 
         try:
             messages = await self.list_messages(thread_id)
+            if context_window_messages:
+                messages = self._recent_messages(messages, context_window_messages)
             
             # temporary fix
             if messages and messages[-1].get('role') == 'assistant':
@@ -359,6 +679,8 @@ class ThreadManager:
                 })
                 
             prepared_messages = [system_message] + messages
+            if context_token_limit:
+                prepared_messages = self._maybe_summarize(prepared_messages, context_token_limit)
             if temporary_message:
                 prepared_messages.append(temporary_message)
 
@@ -416,6 +738,60 @@ class ThreadManager:
                 "status": "error",
                 "message": str(e)
             }
+        finally:
+            await self.flush(thread_id)
+
+    def _recent_messages(self, messages: List[Dict[str, Any]], count: int) -> List[Dict[str, Any]]:
+        """Keep the last count messages and any system messages before them.
+        
+        The window is widened backwards so tool responses are never sent
+        without the assistant message that requested them.
+        """
+        start = max(len(messages) - count, 0)
+        while start > 0 and messages[start].get('role') == 'tool':
+            start -= 1
+        return [msg for msg in messages[:start] if msg.get('role') == 'system'] + messages[start:]
+
+    def _maybe_summarize(self, messages: List[Dict[str, Any]], context_token_limit: int) -> List[Dict[str, Any]]:
+        """Replace older messages with a short summary when the prompt nears the context limit.
+        
+        Args:
+            messages: Prompt messages, starting with the system message
+            context_token_limit: Context size of the model in tokens
+            
+        Returns:
+            List[Dict[str, Any]]: The messages unchanged if they fit, otherwise the
+            system message, one summary message and the most recent messages
+            
+        Notes:
+            - Only the prompt sent to the LLM is affected; the stored thread is unchanged
+            - The summary keeps the role and an excerpt of each older message,
+              no extra LLM call is made
+            - Tool responses are never separated from the assistant message that requested them
+        """
+        if _estimate_tokens(messages) <= SUMMARY_THRESHOLD * context_token_limit:
+            return messages
+
+        head = messages[:1]
+        body = messages[1:]
+        split = max(len(body) - SUMMARY_KEEP_LAST, 0)
+        while split > 0 and body[split].get('role') == 'tool':
+            split -= 1
+        if split == 0:
+            return messages
+
+        excerpts = []
+        for message in body[:split]:
+            text = " ".join(_message_text(message).split())
+            if len(text) > SUMMARY_EXCERPT_CHARS:
+                text = text[:SUMMARY_EXCERPT_CHARS] + "..."
+            excerpts.append(f"- {message.get('role')}: {text}")
+        summary_message = {
+            "role": "user",
+            "content": f"Summary of {split} earlier messages in this conversation:\n" + "\n".join(excerpts)
+        }
+        logging.info(f"Summarized {split} earlier messages to fit the context limit of {context_token_limit} tokens")
+        return head + [summary_message] + body[split:]
 
     async def _run_thread_completion(
         self,
@@ -431,7 +807,7 @@ class ThreadManager:
     ) -> Union[Any, AsyncGenerator]:
         """Get completion from LLM API."""
         return await make_llm_api_call(
-            messages,
+            self._materialize_images(messages),
             model_name,
             temperature=temperature,
             max_tokens=max_tokens,
@@ -453,18 +829,12 @@ class ThreadManager:
             message_index: The index of the message to modify
             new_message: The new message data
         """
-        thread_path = os.path.join(self.threads_dir, f"{thread_id}.json")
         try:
-            with open(thread_path, 'r') as f:
-                thread_data = json.load(f)
-
-            messages = thread_data["messages"]
+            messages = self._load_thread(thread_id)
             if 0 <= message_index < len(messages):
-                messages[message_index] = new_message
-                thread_data["messages"] = messages
-
-                with open(thread_path, 'w') as f:
-                    json.dump(thread_data, f)
+                # Cache a copy, like add_message, so the caller's dict stays its own
+                messages[message_index] = orjson.loads(orjson.dumps(new_message))
+                self._mark_dirty(thread_id)
 
                 logging.info(f"Modified message at index {message_index} in thread {thread_id}")
             else:
@@ -481,18 +851,11 @@ class ThreadManager:
             thread_id: The ID of the thread
             message_index: The index of the message to remove
         """
-        thread_path = os.path.join(self.threads_dir, f"{thread_id}.json")
         try:
-            with open(thread_path, 'r') as f:
-                thread_data = json.load(f)
-
-            messages = thread_data["messages"]
+            messages = self._load_thread(thread_id)
             if 0 <= message_index < len(messages):
                 messages.pop(message_index)
-                thread_data["messages"] = messages
-
-                with open(thread_path, 'w') as f:
-                    json.dump(thread_data, f)
+                self._mark_dirty(thread_id)
 
                 logging.info(f"Removed message at index {message_index} from thread {thread_id}")
             else:
@@ -522,13 +885,14 @@ class ThreadManager:
                 executed_tool_calls=set()
             )
 
-            # Append tool results to user message content
-            original_content = message_data['content']
-            tool_outputs = "\n".join([
-                f"\nTool {result['name']} output: {result['content']}"
-                for result in tool_results
-            ])
-            message_data['content'] = f"{original_content}{tool_outputs}"
+            # Append tool results to user message content, joining all parts once
+            parts = [str(message_data['content'])]
+            for i, result in enumerate(tool_results):
+                if i:
+                    parts.append("\n")
+                parts.append(f"\nTool {result['name']} output: ")
+                parts.append(str(result['content']))
+            message_data['content'] = "".join(parts)
 
             # Remove tool_calls since they're now part of content
             del message_data['tool_calls']
@@ -548,8 +912,36 @@ class ThreadManager:
                     executed_tool_calls=set()
                 )
 
-                for result in tool_results:
-                    await self.add_message(thread_id, result)
+                await self._add_messages(thread_id, tool_results)
+
+    async def _add_messages(self, thread_id: str, messages_data: List[Dict[str, Any]]):
+        """Add several tool result messages to a thread at once.
+        
+        The messages are appended to the history log with one write and the
+        thread is marked dirty once. Unlike add_message, no incomplete tool
+        call check or image handling is done.
+        
+        Args:
+            thread_id: ID of the target thread
+            messages_data: Messages to append, in order
+        """
+        if not messages_data:
+            return
+        try:
+            messages = self._load_thread(thread_id)
+            for message_data in messages_data:
+                content = message_data.get('content')
+                if type(content) is ToolResult:
+                    message_data['content'] = str(content)
+
+            encoded = self._append_history(thread_id, *messages_data)
+            messages.extend([orjson.loads(line) for line in encoded])
+            self._mark_dirty(thread_id)
+            
+            logging.info(f"{len(messages_data)} messages added to thread {thread_id} and history")
+        except Exception as e:
+            logging.error(f"Failed to add messages to thread {thread_id}: {e}")
+            raise e
 
     async def add_to_history_only(self, thread_id: str, message_data: Dict[str, Any]):
         """Add a message only to the history file without affecting the main thread.
@@ -558,24 +950,13 @@ class ThreadManager:
             thread_id: The ID of the thread
             message_data: The message data to add to history
         """
-        history_path = os.path.join(self.threads_dir, f"{thread_id}_history.json")
-
         try:
-            try:
-                with open(history_path, 'r') as f:
-                    history_data = json.load(f)
-            except FileNotFoundError:
-                history_data = {"messages": []}
+            # Convert a ToolResult passed as content to a string
+            content = message_data.get('content')
+            if type(content) is ToolResult:
+                message_data['content'] = str(content)
 
-            # Process ToolResult instances
-            for key, value in message_data.items():
-                if isinstance(value, ToolResult):
-                    message_data[key] = str(value)
-
-            history_data["messages"].append(message_data)
-
-            with open(history_path, 'w') as f:
-                json.dump(history_data, f)
+            self._append_history(thread_id, message_data)
 
             logging.info(f"Message added to history of thread {thread_id}")
 
@@ -613,14 +994,14 @@ class ThreadManager:
             FileNotFoundError: If thread doesn't exist
             Exception: For other operation failures
         """
-        thread_path = os.path.join(self.threads_dir, f"{thread_id}.json")
-
-        empty_data = {"messages": []}
-
         try:
+            # A thread that isn't cached yet must exist on disk; its messages don't need loading
+            if thread_id not in self._thread_cache and not os.path.exists(self._thread_path(thread_id)):
+                raise FileNotFoundError(self._thread_path(thread_id))
+
             # Reset only main thread file, preserving history
-            with open(thread_path, 'w') as f:
-                json.dump(empty_data, f)
+            self._thread_cache[thread_id] = []
+            self._mark_dirty(thread_id)
 
             logging.info(f"Reset messages for thread {thread_id} (history preserved)")
 
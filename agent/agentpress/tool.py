@@ -90,6 +90,9 @@ class ToolResult:
     def __str__(self) -> str:
         return self.output
 
+# Schemas of the decorated methods of each Tool subclass, see Tool._register_schemas
+_schemas_by_class: Dict[type, Dict[str, List[ToolSchema]]] = {}
+
 class Tool(ABC):
     """Abstract base class for all tools.
     
@@ -111,10 +114,21 @@ class Tool(ABC):
         self._register_schemas()
 
     def _register_schemas(self):
-        """Register schemas from all decorated methods."""
-        for name, method in inspect.getmembers(self, predicate=inspect.ismethod):
-            if hasattr(method, 'tool_schemas'):
-                self._schemas[name] = method.tool_schemas
+        """Register schemas from all decorated methods.
+        
+        The decorated methods are looked up on the class once and shared by
+        all of its instances.
+        """
+        cls = type(self)
+        schemas = _schemas_by_class.get(cls)
+        if schemas is None:
+            schemas = {
+                name: function.tool_schemas
+                for name, function in inspect.getmembers(cls, predicate=inspect.isfunction)
+                if hasattr(function, 'tool_schemas')
+            }
+            _schemas_by_class[cls] = schemas
+        self._schemas.update(schemas)
 
     def get_schemas(self) -> Dict[str, List[ToolSchema]]:
         """Get all registered tool schemas.
@@ -19,6 +19,7 @@ class ToolRegistry:
         get_xml_tool: Get a tool by XML tag name
         get_openapi_schemas: Get OpenAPI schemas for function calling
         get_xml_examples: Get examples of XML tool usage
+        aclose: Release resources held by the registered tool instances
     """
     
     _instance = None
@@ -29,6 +30,9 @@ class ToolRegistry:
             cls._instance = super().__new__(cls)
             cls._instance.tools = {}
             cls._instance.xml_tools = {}
+            cls._instance._openapi_schemas = None
+            cls._instance._available_functions = None
+            cls._instance._xml_examples = None
         return cls._instance
     
     def register_tool(self, tool_class: Type[Tool], function_names: Optional[List[str]] = None, **kwargs):
@@ -45,6 +49,9 @@ class ToolRegistry:
         """
         tool_instance = tool_class(**kwargs)
         schemas = tool_instance.get_schemas()
+        self._openapi_schemas = None
+        self._available_functions = None
+        self._xml_examples = None
         
         logging.info(f"Registering tool class: {tool_class.__name__}")
         logging.info(f"Available schemas: {list(schemas.keys())}")
@@ -72,14 +79,19 @@ class ToolRegistry:
         
         Returns:
             Dict mapping function names to their implementations
+            
+        Notes:
+            The mapping is built once and reused until the next register_tool call
         """
-        available_functions = {}
-        for tool_name, tool_info in self.tools.items():
-            tool_instance = tool_info['instance']
-            for func_name, func in tool_instance.__class__.__dict__.items():
-                if callable(func) and not func_name.startswith("__"):
-                    available_functions[func_name] = getattr(tool_instance, func_name)
-        return available_functions
+        if self._available_functions is None:
+            available_functions = {}
+            for tool_name, tool_info in self.tools.items():
+                tool_instance = tool_info['instance']
+                for func_name, func in tool_instance.__class__.__dict__.items():
+                    if callable(func) and not func_name.startswith("__"):
+                        available_functions[func_name] = getattr(tool_instance, func_name)
+            self._available_functions = available_functions
+        return self._available_functions
 
     def get_tool(self, tool_name: str) -> Dict[str, Any]:
         """Get a specific tool by name.
@@ -108,22 +120,48 @@ class ToolRegistry:
         
         Returns:
             List of OpenAPI-compatible schema definitions
+            
+        Notes:
+            The list is built once and reused until the next register_tool call
         """
-        return [
-            tool_info['schema'].schema 
-            for tool_info in self.tools.values()
-            if tool_info['schema'].schema_type == SchemaType.OPENAPI
-        ]
+        if self._openapi_schemas is None:
+            self._openapi_schemas = [
+                tool_info['schema'].schema 
+                for tool_info in self.tools.values()
+                if tool_info['schema'].schema_type == SchemaType.OPENAPI
+            ]
+        return self._openapi_schemas
 
     def get_xml_examples(self) -> Dict[str, str]:
         """Get all XML tag examples.
         
         Returns:
             Dict mapping tag names to their example usage
+            
+        Notes:
+            The mapping is built once and reused until the next register_tool call
+        """
+        if self._xml_examples is None:
+            examples = {}
+            for tool_info in self.xml_tools.values():
+                schema = tool_info['schema']
+                if schema.xml_schema and schema.xml_schema.example:
+                    examples[schema.xml_schema.tag_name] = schema.xml_schema.example
+            self._xml_examples = examples
+        return self._xml_examples
+
+    async def aclose(self):
+        """Close every registered tool instance that holds resources.
+
+        Tools that keep connections or sessions open define an async aclose method;
+        they reopen them on their next use.
         """
-        examples = {}
-        for tool_info in self.xml_tools.values():
-            schema = tool_info['schema']
-            if schema.xml_schema and schema.xml_schema.example:
-                examples[schema.xml_schema.tag_name] = schema.xml_schema.example
-        return examples
+        instances = {id(tool_info['instance']): tool_info['instance']
+                     for tool_info in [*self.tools.values(), *self.xml_tools.values()]}
+        for tool_instance in instances.values():
+            aclose = getattr(tool_instance, 'aclose', None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception:
+                    logging.error(f"Error closing tool {type(tool_instance).__name__}", exc_info=True)
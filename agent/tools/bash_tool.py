@@ -1,54 +1,650 @@
 # agent/tools/bash_tool.py
 
 import asyncio
+import base64
+import logging
+import os
+import re
+import secrets
+import signal
+import sys
+import weakref
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from functools import cached_property
+from typing import Dict, List, Optional
+import aiohttp
 from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
 from agentpress.state_manager import StateManager
 
+# Bytes read from the bash session pipes per read call
+SESSION_READ_SIZE = 65536
+# Bytes kept from the start and from the end of a command's stdout or stderr
+OUTPUT_HEAD_BYTES = 256 * 1024
+OUTPUT_TAIL_BYTES = 256 * 1024
+# output_limit for callers that need the complete output, e.g. file contents they write back
+NO_OUTPUT_LIMIT = sys.maxsize
+# Combined output size above which decoding moves off the event loop thread
+DECODE_IN_THREAD_BYTES = 256 * 1024
+# Maximum number of read-only command results remembered per container
+COMMAND_CACHE_SIZE = 128
+# Seconds a timed-out process gets to exit after SIGTERM before it is killed
+TERMINATE_GRACE = 2
+
+# Sends SIGTERM to a process and all of its descendants, found through /proc
+# because procps isn't installed in every container
+KILL_TREE = (
+    '_kill_tree() { local c; '
+    'for c in $(cat /proc/$1/task/*/children 2>/dev/null); do _kill_tree "$c"; done; '
+    'kill -TERM "$1" 2>/dev/null; }; '
+    '_kill_tree'
+)
+# Environment variable marking the processes of a one-off exec, so they can be found
+# and stopped inside the container when the exec times out
+EXEC_ID_VARIABLE = 'BASH_TOOL_EXEC_ID'
+# Sends SIGTERM to every process whose environment contains the given VAR=value entry
+KILL_BY_ENV = (
+    '_kill_env() { local p; for p in /proc/[0-9]*; do '
+    'grep -qzxF "$1" "$p/environ" 2>/dev/null && kill -TERM "${p#/proc/}" 2>/dev/null; done; }; '
+    '_kill_env'
+)
+
+# Seconds a command may run before it is stopped
+COMMAND_TIMEOUT = 120
+# Raw result of a command that ran out of time
+TIMEOUT_RESULT = (b'', f'Command execution timed out after {COMMAND_TIMEOUT} seconds'.encode(), 1)
+
+# Tool responses for a finished command and for a command that couldn't be run
+OUTPUT_TEMPLATE = "\nCommand executed: `%s`\n<output>%s</output>"
+ERROR_TEMPLATE = "Command executed: `%s`\nError executing bash command: %s"
+
+# docker execs that may be starting up at once across all bash tools
+MAX_CONCURRENT_EXECS = min(32, (os.cpu_count() or 1) + 4)
+
+# File inside the container recording that CONTAINER_SETUP has been applied, so a
+# container recreated under the same name is set up again
+CONTAINER_SETUP_MARKER = '/tmp/.bash_tool_container_setup'
+# Git settings applied once per container instead of before every command
+CONTAINER_SETUP = (
+    f'{{ [ -e {CONTAINER_SETUP_MARKER} ] || {{ '
+    f'git config --global --add safe.directory /testbed && git config --global core.pager cat && '
+    f'touch {CONTAINER_SETUP_MARKER}; }}; }}'
+)
+
+# Side-effect-free commands whose output can be reused until anything else runs in the container
+_CACHEABLE_COMMAND_RE = re.compile(
+    r'^\s*(?!.*--output)(?:ls|cat|pwd|head|wc|grep|git (?:status|diff|log|show))(?:\s[^;&|<>`$\\\n]*)?$'
+)
+# Shell syntax after which a command may not be a single plain program call
+_SHELL_SYNTAX_RE = re.compile(r'[|&;<>$`\\()*?\[\]{}"\'~=#!\n]')
+# Programs and builtins known not to change the session shell's state; plain calls of
+# these run directly in the session, anything else gets a subshell
+_SESSION_SAFE_COMMANDS = frozenset({
+    'awk', 'cat', 'cp', 'cut', 'df', 'diff', 'du', 'echo', 'false', 'file', 'find', 'git',
+    'grep', 'head', 'ls', 'mkdir', 'mv', 'nl', 'pip', 'pwd', 'pytest', 'python', 'python3',
+    'rm', 'sed', 'sort', 'stat', 'tail', 'touch', 'tr', 'tree', 'true', 'uniq', 'wc', 'which',
+})
+# Cached raw (stdout, stderr, returncode) of read-only commands, per container
+_command_cache: Dict[str, OrderedDict] = {}
+# Times each container's command cache was invalidated, so a read that overlapped a
+# write isn't cached after the write already cleared the cache
+_command_cache_generation: Dict[str, int] = {}
+# Bounds bash session setups and one-off execs so a burst of calls can't swamp dockerd;
+# one semaphore per event loop, since a semaphore is bound to the loop it is first used in
+_exec_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_exec_waiters = 0
+
+
+def _decode(data: bytes) -> str:
+    """Decode command output once, replacing invalid UTF-8 instead of failing."""
+    return data.decode('utf-8', errors='replace')
+
+
+async def _decode_outputs(*outputs: bytes):
+    """Decode command outputs, in worker threads when they are large.
+
+    Returns:
+        tuple: The decoded outputs, in order
+    """
+    if sum(map(len, outputs)) <= DECODE_IN_THREAD_BYTES:
+        return tuple(map(_decode, outputs))
+    return tuple(await asyncio.gather(*(asyncio.to_thread(_decode, output) for output in outputs)))
+
+
+def _docker_socket_path() -> Optional[str]:
+    """Return the Docker daemon's unix socket, or None if DOCKER_HOST points elsewhere."""
+    host = os.environ.get('DOCKER_HOST', 'unix:///var/run/docker.sock')
+    if host.startswith('unix://'):
+        return host[len('unix://'):]
+    return None
+
+
+async def _read_multiplexed(stream: aiohttp.StreamReader, output_limit: Optional[int] = None):
+    """Split a Docker exec output stream into stdout and stderr.
+
+    Each frame starts with an 8-byte header holding the stream type (1 for
+    stdout, 2 for stderr) and the big-endian payload size.
+
+    Returns:
+        tuple: (stdout bytes, stderr bytes)
+    """
+    stdout, stderr = _OutputCapture(output_limit), _OutputCapture(output_limit)
+    while True:
+        try:
+            header = await stream.readexactly(8)
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                raise RuntimeError("Truncated Docker exec output stream")
+            return stdout.getvalue(), stderr.getvalue()
+        payload = await stream.readexactly(int.from_bytes(header[4:8], 'big'))
+        (stderr if header[0] == 2 else stdout).append(payload)
+
+
+def _needs_subshell(script: str) -> bool:
+    """Whether a script must be isolated from the bash session in a subshell.
+
+    Plain calls of the _SESSION_SAFE_COMMANDS, like `ls src` or `git status`,
+    can't affect the session and are run by the session shell itself, which
+    saves forking a subshell.
+    """
+    if _SHELL_SYNTAX_RE.search(script):
+        return True
+    words = script.split()
+    return not words or words[0] not in _SESSION_SAFE_COMMANDS
+
+
+def invalidate_command_cache(container_name: str):
+    """Forget cached command output for a container whose files may have changed."""
+    _command_cache.pop(container_name, None)
+    _command_cache_generation[container_name] = _command_cache_generation.get(container_name, 0) + 1
+
+
+
+class _OutputCapture:
+    """Collects command output, keeping only its head and tail once it exceeds the cap.
+
+    output_limit replaces OUTPUT_HEAD_BYTES and OUTPUT_TAIL_BYTES for callers that keep less,
+    or, as NO_OUTPUT_LIMIT, keeps all of the output.
+    """
+
+    def __init__(self, output_limit: Optional[int] = None):
+        self.head_bytes = output_limit or OUTPUT_HEAD_BYTES
+        self.tail_bytes = output_limit or OUTPUT_TAIL_BYTES
+        self.head = bytearray()
+        self.tail = deque()
+        self.tail_size = 0
+        self.dropped = 0
+
+    def append(self, data: bytes):
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if not data:
+            return
+        self.tail.append(bytes(data))
+        self.tail_size += len(data)
+        while self.tail_size - len(self.tail[0]) >= self.tail_bytes:
+            chunk = self.tail.popleft()
+            self.tail_size -= len(chunk)
+            self.dropped += len(chunk)
+
+    def getvalue(self) -> bytes:
+        tail = b"".join(self.tail)
+        dropped = self.dropped + max(len(tail) - self.tail_bytes, 0)
+        if not dropped:
+            return bytes(self.head) + tail
+        return bytes(self.head) + f"\n...[{dropped} bytes truncated]...\n".encode() + tail[-self.tail_bytes:]
+
+
+async def _capture_stream(stream: asyncio.StreamReader, output_limit: Optional[int] = None) -> bytes:
+    """Read a stream to EOF, keeping only the head and tail of large output."""
+    capture = _OutputCapture(output_limit)
+    while chunk := await stream.read(SESSION_READ_SIZE):
+        capture.append(chunk)
+    return capture.getvalue()
+
+
+async def _read_frame(stream: asyncio.StreamReader, buffer: bytearray, marker: bytes, output_limit: Optional[int] = None):
+    """Read a session stream up to a sentinel line.
+
+    Parameters:
+        stream: stdout or stderr of the bash session
+        buffer: Bytes already read from the stream but not consumed yet; the
+            frame is removed from it and anything after the sentinel is kept
+        marker: Newline, token and space that start the sentinel line
+        output_limit: Bytes kept from the head and the tail of the output, if not the default
+
+    Returns:
+        tuple: (output before the sentinel, return code from the sentinel)
+    """
+    capture = _OutputCapture(output_limit)
+    while True:
+        index = buffer.find(marker)
+        if index >= 0:
+            end = buffer.find(b"\n", index + len(marker))
+            if end >= 0:
+                capture.append(buffer[:index])
+                returncode = int(buffer[index + len(marker):end])
+                del buffer[:end + 1]
+                return capture.getvalue(), returncode
+        elif len(buffer) > len(marker):
+            # Hand everything but a possible partial sentinel over to the capture
+            capture.append(buffer[:-len(marker)])
+            del buffer[:-len(marker)]
+        chunk = await stream.read(SESSION_READ_SIZE)
+        if not chunk:
+            raise RuntimeError("Bash session exited unexpectedly")
+        buffer += chunk
+
+@asynccontextmanager
+async def _exec_slot(container_name: str):
+    """Hold one of the MAX_CONCURRENT_EXECS docker exec slots."""
+    global _exec_waiters
+    loop = asyncio.get_running_loop()
+    slots = _exec_slots.get(loop)
+    if slots is None:
+        slots = _exec_slots[loop] = asyncio.Semaphore(MAX_CONCURRENT_EXECS)
+    if slots.locked():
+        _exec_waiters += 1
+        logging.debug(f"Waiting for a docker exec slot for {container_name} ({_exec_waiters} waiting)")
+        try:
+            await slots.acquire()
+        finally:
+            _exec_waiters -= 1
+    else:
+        await slots.acquire()
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+async def _terminate(process: asyncio.subprocess.Process):
+    """Stop a process started with start_new_session=True and reap it.
+
+    The whole process group gets SIGTERM first and SIGKILL only if it is still
+    running after TERMINATE_GRACE seconds.
+    """
+    if process.returncode is not None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    try:
+        async with asyncio.timeout(TERMINATE_GRACE):
+            await process.wait()
+    except TimeoutError:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+
+
 class BashTool(Tool):
     def __init__(self, container_name: str, state_file: str):
         super().__init__()
         self.container_name = container_name
-        self.state_manager = StateManager(store_file=state_file)
+        self._state_file = state_file
         self.environment_setup = (
             f'. /opt/miniconda3/etc/profile.d/conda.sh && '
             f'conda activate testbed && '
             f'cd /testbed && '
-            f'git config --global --add safe.directory /testbed && '
-            f'git config --global core.pager cat && '
         )
+        # Prefix for one-off execs
+        self._prefix = self.environment_setup + CONTAINER_SETUP + ' && '
+        self._session: Optional[asyncio.subprocess.Process] = None
+        # PID of the session's bash inside the container
+        self._session_pid: Optional[int] = None
+        self._session_lock = asyncio.Lock()
+        self._stdout_buffer = bytearray()
+        self._stderr_buffer = bytearray()
+        self._pending_commands = []
+        self._batch_task: Optional[asyncio.Task] = None
+        self._docker_api: Optional[aiohttp.ClientSession] = None
+
+    @cached_property
+    def state_manager(self) -> StateManager:
+        """State store for this tool, created on first use."""
+        return StateManager(store_file=self._state_file)
 
     async def execute_command_in_container(self, command: str):
         """
         Executes a given bash command inside the specified Docker container.
 
+        Successful read-only commands such as `ls`, `cat` or `git diff` are
+        answered from a per-container cache until any other command runs in
+        the container. Other commands run in a persistent `docker exec` bash
+        session that is set up once, so each call skips container attach and
+        conda activation. Commands run from /testbed with stdin closed. Plain
+        calls of programs that can't change the shell's state, such as
+        `ls src` or `python -m pytest`, run directly in the session shell; every
+        other command runs in its own subshell, so directory changes, variables
+        and `exit` don't leak into later commands. Falls back to a one-off
+        `docker exec` if the session cannot be started.
+
         Parameters:
             command (str): The bash command to execute.
 
         Returns:
             tuple: (stdout, stderr, returncode)
         """
-        full_command = (
-            f'{self.environment_setup}'
-            f'set -o pipefail && '
-            f'{command}'
+        stdout, stderr, returncode = await self.execute_command_raw(command)
+        stdout, stderr = await _decode_outputs(stdout, stderr)
+        return stdout, stderr, returncode
+
+    async def execute_command_raw(self, command: str, output_limit: Optional[int] = None):
+        """Run a command, or reuse a cached result, without decoding its output.
+
+        Parameters:
+            command (str): The bash command to execute.
+            output_limit (int, optional): Bytes to keep from the head and from the tail of
+                stdout and of stderr while they are read, instead of OUTPUT_HEAD_BYTES and
+                OUTPUT_TAIL_BYTES. NO_OUTPUT_LIMIT keeps the complete output.
+
+        Returns:
+            tuple: (stdout bytes, stderr bytes, returncode)
+        """
+        if _CACHEABLE_COMMAND_RE.match(command) is None:
+            invalidate_command_cache(self.container_name)
+            try:
+                return await self._execute_in_session(command, output_limit)
+            finally:
+                invalidate_command_cache(self.container_name)
+
+        key = command if output_limit is None else (command, output_limit)
+        cache = _command_cache.get(self.container_name)
+        if cache is not None and key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        generation = _command_cache_generation.get(self.container_name, 0)
+        result = await self._execute_in_session(command, output_limit)
+        # Commands running concurrently may have changed files while this one ran
+        if result[2] == 0 and generation == _command_cache_generation.get(self.container_name, 0):
+            cache = _command_cache.setdefault(self.container_name, OrderedDict())
+            cache[key] = result
+            if len(cache) > COMMAND_CACHE_SIZE:
+                cache.popitem(last=False)
+        return result
+
+    async def _execute_in_session(self, command: str, output_limit: Optional[int] = None):
+        """Queue a command for the bash session and wait for its result.
+
+        Commands issued while the session is busy, or together in the same
+        event loop iteration (e.g. parallel tool calls), are sent to the
+        session as one batch and their results are read back in order.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending_commands.append((command, output_limit, future))
+        if self._batch_task is None or self._batch_task.done():
+            self._batch_task = asyncio.get_running_loop().create_task(self._drain_pending_commands())
+        return await future
+
+    async def _drain_pending_commands(self):
+        while self._pending_commands:
+            batch, self._pending_commands = self._pending_commands, []
+            async with self._session_lock:
+                await self._run_batch(batch)
+
+    async def _run_batch(self, batch):
+        """Run a batch of queued commands in the session, resolving each command's future."""
+        try:
+            await self._run_batch_in_session(batch)
+        except Exception as e:
+            # The session is in an unknown state; nothing else would resolve these futures
+            logging.error(f"Bash session failed for {self.container_name}: {e}", exc_info=True)
+            await self._kill_session()
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        except BaseException:
+            for _, _, future in batch:
+                future.cancel()
+            raise
+
+    async def _run_batch_in_session(self, batch):
+        while batch:
+            if self._session is None or self._session.returncode is not None:
+                try:
+                    async with _exec_slot(self.container_name), asyncio.timeout(COMMAND_TIMEOUT):
+                        await self._start_session()
+                except (OSError, RuntimeError, TimeoutError) as e:
+                    await self._kill_session()
+                    logging.warning(f"Bash session unavailable for {self.container_name}, running commands directly: {e}")
+                    for command, output_limit, future in batch:
+                        async with _exec_slot(self.container_name):
+                            await self._resolve(future, self._execute_once(command, output_limit))
+                    return
+
+            try:
+                tokens = await self._send_to_session([command for command, _, _ in batch], subshell=True)
+            except (OSError, RuntimeError) as e:
+                await self._kill_session()
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for index, ((_, output_limit, future), token) in enumerate(zip(batch, tokens)):
+                try:
+                    async with asyncio.timeout(COMMAND_TIMEOUT):
+                        stdout, stderr, returncode = await self._read_from_session(token, output_limit)
+                except TimeoutError:
+                    result = TIMEOUT_RESULT
+                except Exception as e:
+                    result = e
+                else:
+                    if not future.done():
+                        future.set_result((stdout, stderr, returncode))
+                    continue
+                # The session is in an unknown state; the commands queued behind this
+                # one have not started yet and are rerun in a fresh session
+                await self._kill_session()
+                if not future.done():
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+                batch = batch[index + 1:]
+                break
+            else:
+                batch = []
+
+    @staticmethod
+    async def _resolve(future: asyncio.Future, coroutine):
+        try:
+            result = await coroutine
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    async def _start_session(self):
+        """Start the persistent bash session and run the environment setup in it once."""
+        self._session = await asyncio.create_subprocess_exec(
+            'docker', 'exec', '-i', self.container_name, '/bin/bash',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True
         )
+        self._session_pid = None
+        self._stdout_buffer = bytearray()
+        self._stderr_buffer = bytearray()
+        (token,) = await self._send_to_session(
+            [f'{self.environment_setup}{CONTAINER_SETUP} && echo $$'], subshell=False
+        )
+        stdout, stderr, returncode = await self._read_from_session(token)
+        if returncode != 0:
+            await self._kill_session()
+            raise RuntimeError(f"environment setup failed: {_decode(stderr).strip()}")
+        self._session_pid = int(stdout.split()[-1])
+
+    async def _send_to_session(self, scripts, subshell: bool):
+        """Write scripts to the bash session in one write, each followed by its sentinel lines.
+
+        Returns:
+            list: The sentinel token of each script, in order
+        """
+        tokens = []
+        framed = []
+        for script in scripts:
+            token = secrets.token_hex(16)
+            encoded = base64.b64encode(script.encode()).decode()
+            run = f'eval "$(printf %s {encoded} | base64 -d)"'
+            if subshell and not _needs_subshell(script):
+                run = f'{run} </dev/null'
+            elif subshell:
+                if '|' in script:
+                    run = f'( set -o pipefail; {run} ) </dev/null'
+                else:
+                    run = f'( {run} ) </dev/null'
+            framed.append(
+                f'{run}\n'
+                f'__rc=$?; printf "\\n%s %d\\n" {token} $__rc; printf "\\n%s %d\\n" {token} $__rc >&2\n'
+            )
+            tokens.append(token)
+        self._session.stdin.write("".join(framed).encode())
+        await self._session.stdin.drain()
+        return tokens
+
+    async def _read_from_session(self, token: str, output_limit: Optional[int] = None):
+        """Collect the output of one script from the bash session up to its sentinel lines."""
+        marker = f'\n{token} '.encode()
+        (stdout, returncode), (stderr, _) = await asyncio.gather(
+            _read_frame(self._session.stdout, self._stdout_buffer, marker, output_limit),
+            _read_frame(self._session.stderr, self._stderr_buffer, marker, output_limit)
+        )
+        return stdout, stderr, returncode
+
+    async def _kill_session(self):
+        """Stop the session along with whatever it is still running inside the container."""
+        session, self._session = self._session, None
+        session_pid, self._session_pid = self._session_pid, None
+        if session is None or session.returncode is not None:
+            return
+        if session_pid is not None:
+            await self._kill_in_container(f'{KILL_TREE} {session_pid}')
+        await _terminate(session)
+
+    async def _kill_in_container(self, kill_command: str):
+        """Best-effort SIGTERM to processes inside the container, running KILL_TREE or KILL_BY_ENV.
+
+        Stopping the local `docker` client doesn't stop what it started in the
+        container, so a timed-out command would otherwise keep running there.
+        """
+        try:
+            process = await asyncio.create_subprocess_exec(
+                'docker', 'exec', self.container_name, '/bin/bash', '-c', kill_command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                start_new_session=True
+            )
+        except OSError as e:
+            logging.warning(f"Could not stop bash session processes in {self.container_name}: {e}")
+            return
+        try:
+            async with asyncio.timeout(10):
+                await process.wait()
+        except TimeoutError:
+            await _terminate(process)
+
+    async def aclose(self):
+        """Shut down the persistent bash session and the Docker API connection pool."""
+        async with self._session_lock:
+            session, self._session = self._session, None
+            self._session_pid = None
+            if session is not None and session.returncode is None:
+                session.stdin.close()
+                try:
+                    async with asyncio.timeout(5):
+                        await session.wait()
+                except TimeoutError:
+                    await _terminate(session)
+            docker_api, self._docker_api = self._docker_api, None
+            if docker_api is not None:
+                await docker_api.close()
+
+    async def _execute_once(self, command: str, output_limit: Optional[int] = None):
+        """Run a single command in a fresh exec instance.
+
+        The exec is created through the Docker Engine API on the daemon's unix
+        socket, reusing one pooled connection per tool. The `docker` CLI is
+        only used when the socket can't be reached. The exec's processes carry
+        EXEC_ID_VARIABLE, so they are stopped inside the container on timeout.
+        """
+        exec_marker = f'{EXEC_ID_VARIABLE}={secrets.token_hex(16)}'
+        prefix = self._prefix
+        if '|' in command:
+            # pipefail only matters when the command has a pipeline
+            prefix += 'set -o pipefail && '
+        full_command = prefix + command
+        socket_path = _docker_socket_path()
+        if socket_path is not None:
+            try:
+                async with asyncio.timeout(COMMAND_TIMEOUT):
+                    stdout, stderr, returncode = await self._exec_via_api(socket_path, ['/bin/bash', '-c', full_command], output_limit, [exec_marker])
+            except TimeoutError:
+                await self._kill_in_container(f'{KILL_BY_ENV} {exec_marker}')
+                return TIMEOUT_RESULT
+            except aiohttp.ClientConnectorError as e:
+                logging.warning(f"Docker API unavailable at {socket_path}, using the docker CLI: {e}")
+            else:
+                return stdout, stderr, returncode
+
         cmd = [
             'docker', 'exec',
-            '-i',  # Interactive mode
+            '-e', exec_marker,
             self.container_name,
             '/bin/bash', '-c', full_command
         ]
         process = await asyncio.create_subprocess_exec(
             *cmd,
+            stdin=asyncio.subprocess.DEVNULL,  # Nothing is written to the command
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True
         )
         try:
-            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=120)  # 5 minutes timeout
-        except asyncio.TimeoutError:
-            process.kill()
-            return '', 'Command execution timed out after 5 minutes', 1
-        return stdout.decode(), stderr.decode(), process.returncode
+            async with asyncio.timeout(COMMAND_TIMEOUT):
+                stdout, stderr = await asyncio.gather(
+                    _capture_stream(process.stdout, output_limit),
+                    _capture_stream(process.stderr, output_limit)
+                )
+                await process.wait()
+        except TimeoutError:
+            await asyncio.gather(_terminate(process), self._kill_in_container(f'{KILL_BY_ENV} {exec_marker}'))
+            return TIMEOUT_RESULT
+        return stdout, stderr, process.returncode
+
+    async def _exec_via_api(self, socket_path: str, cmd, output_limit: Optional[int] = None, env: Optional[List[str]] = None):
+        """Run a command through the Docker Engine exec endpoints, with env as extra VAR=value entries.
+
+        Returns:
+            tuple: (stdout bytes, stderr bytes, exit code)
+        """
+        if self._docker_api is None or self._docker_api.closed:
+            self._docker_api = aiohttp.ClientSession(connector=aiohttp.UnixConnector(path=socket_path))
+        api = self._docker_api
+        async with api.post(
+            f'http://docker/containers/{self.container_name}/exec',
+            json={"AttachStdout": True, "AttachStderr": True, "Tty": False, "Cmd": cmd, "Env": env or []}
+        ) as response:
+            if response.status != 201:
+                raise RuntimeError(f"Docker exec create failed ({response.status}): {await response.text()}")
+            exec_id = (await response.json())["Id"]
+        async with api.post(f'http://docker/exec/{exec_id}/start', json={"Detach": False, "Tty": False}) as response:
+            if response.status != 200:
+                raise RuntimeError(f"Docker exec start failed ({response.status}): {await response.text()}")
+            stdout, stderr = await _read_multiplexed(response.content, output_limit)
+        async with api.get(f'http://docker/exec/{exec_id}/json') as response:
+            returncode = (await response.json())["ExitCode"]
+        return stdout, stderr, returncode
 
     @openapi_schema({
         "type": "function",
@@ -108,13 +704,13 @@ class BashTool(Tool):
     )
     async def bash_command(self, command: str) -> ToolResult:
         try:
-            stdout, stderr, returncode = await self.execute_command_in_container(command)
-            output = f"\nCommand executed: `{command}`\n"
+            stdout, stderr, returncode = await self.execute_command_raw(command)
             if returncode == 0:
-                output += f"<output>{stdout.strip() if stdout.strip() else 'No output.'}</output>"
-                return self.success_response(output)
+                # stderr is ignored on success, so it is never decoded
+                (stdout,) = await _decode_outputs(stdout)
+                return self.success_response(OUTPUT_TEMPLATE % (command, stdout.strip() or 'No output.'))
             else:
-                output += f"<output>{stdout.strip()}\n{stderr.strip()}</output>"
-                return self.fail_response(output)
+                stdout, stderr = await _decode_outputs(stdout, stderr)
+                return self.fail_response(OUTPUT_TEMPLATE % (command, stdout.strip() + '\n' + stderr.strip()))
         except Exception as e:
-            return self.fail_response(f"Command executed: `{command}`\nError executing bash command: {str(e)}")
+            return self.fail_response(ERROR_TEMPLATE % (command, e))
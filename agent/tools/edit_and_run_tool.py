@@ -5,7 +5,61 @@ from agentpress.state_manager import StateManager
 import os
 from typing import List, Optional, Literal
 from pathlib import Path
-from tools.bash_tool import BashTool
+from tools.bash_tool import BashTool, invalidate_command_cache
+
+# Script run inside the container by str_replace; it is written to the container
+# once per tool instead of being sent with every replacement
+STR_REPLACE_SCRIPT_PATH = '/tmp/edit_tool_str_replace.py'
+STR_REPLACE_SCRIPT = '''import sys
+import base64
+import difflib
+import os
+
+path = sys.argv[1]
+old_str = base64.b64decode(sys.argv[2]).decode('utf-8')
+new_str = base64.b64decode(sys.argv[3]).decode('utf-8')
+
+# Read the file content
+with open(path, 'r') as f:
+    content = f.read()
+
+occurrences = content.count(old_str)
+if occurrences == 0:
+    print(f"The string '{{old_str}}' was not found in the file.", file=sys.stderr)
+    sys.exit(1)
+elif occurrences > 1:
+    print(f"The string '{{old_str}}' was found multiple times in the file. Please ensure it is unique.", file=sys.stderr)
+    sys.exit(1)
+
+# Save current content for undo
+history_dir = '/tmp/edit_tool_history'
+os.makedirs(history_dir, exist_ok=True)
+history_file = os.path.join(history_dir, base64.b64encode(path.encode()).decode())
+with open(history_file, 'a') as hf:
+    hf.write(base64.b64encode(content.encode()).decode() + '\\n')
+
+# Replace the old string with the new string
+new_content = content.replace(old_str, new_str, 1)
+
+# Write the new content back to the file
+with open(path, 'w') as f:
+    f.write(new_content)
+
+print(f"Successfully replaced string in `" + path + "`.")
+
+# Print the diff for logging
+# diff = difflib.unified_diff(
+#     content.splitlines(),
+#     new_content.splitlines(),
+#     fromfile='original',
+#     tofile='modified',
+#     lineterm=''
+# )
+# print("Changes:")
+# for line in diff:
+#     print(line)
+'''
+STR_REPLACE_SCRIPT_BASE64 = base64.b64encode(STR_REPLACE_SCRIPT.encode('utf-8')).decode('ascii')
 
 class EditTool(Tool):
     def __init__(self, container_name: str, state_file: str):
@@ -19,6 +73,11 @@ class EditTool(Tool):
         )
         self.file_history = {}  # For undo_edit command
         self.bash_tool = BashTool(container_name, state_file)  # Instantiate BashTool
+        self._str_replace_installed = False  # Whether STR_REPLACE_SCRIPT is in the container yet
+
+    async def aclose(self):
+        """Shut down the bash tool's session and connections."""
+        await self.bash_tool.aclose()
 
     async def execute_command_in_container(self, command: str):
         """
@@ -36,16 +95,18 @@ class EditTool(Tool):
         )
         cmd = [
             'docker', 'exec',
-            '-i',  # Interactive mode
             self.container_name,
             '/bin/bash', '-c', full_command
         ]
         process = await asyncio.create_subprocess_exec(
             *cmd,
+            stdin=asyncio.subprocess.DEVNULL,  # Nothing is written to the command
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
         stdout, stderr = await process.communicate()
+        # Edits change files behind the bash tool's back
+        invalidate_command_cache(self.container_name)
         return stdout.decode(), stderr.decode(), process.returncode
 
     Command = Literal[
@@ -327,60 +388,6 @@ class EditTool(Tool):
             old_str_base64 = base64.b64encode(old_str.encode('utf-8')).decode('ascii')
             new_str_base64 = base64.b64encode(new_str.encode('utf-8')).decode('ascii')
 
-            # Define the Python code to execute inside the container
-            python_code = '''
-import sys
-import base64
-import difflib
-import os
-
-path = sys.argv[1]
-old_str = base64.b64decode(sys.argv[2]).decode('utf-8')
-new_str = base64.b64decode(sys.argv[3]).decode('utf-8')
-
-# Read the file content
-with open(path, 'r') as f:
-    content = f.read()
-
-occurrences = content.count(old_str)
-if occurrences == 0:
-    print(f"The string '{{old_str}}' was not found in the file.", file=sys.stderr)
-    sys.exit(1)
-elif occurrences > 1:
-    print(f"The string '{{old_str}}' was found multiple times in the file. Please ensure it is unique.", file=sys.stderr)
-    sys.exit(1)
-
-# Save current content for undo
-history_dir = '/tmp/edit_tool_history'
-os.makedirs(history_dir, exist_ok=True)
-history_file = os.path.join(history_dir, base64.b64encode(path.encode()).decode())
-with open(history_file, 'a') as hf:
-    hf.write(base64.b64encode(content.encode()).decode() + '\\n')
-
-# Replace the old string with the new string
-new_content = content.replace(old_str, new_str, 1)
-
-# Write the new content back to the file
-with open(path, 'w') as f:
-    f.write(new_content)
-
-print(f"Successfully replaced string in `" + path + "`.")
-
-# Print the diff for logging
-# diff = difflib.unified_diff(
-#     content.splitlines(),
-#     new_content.splitlines(),
-#     fromfile='original',
-#     tofile='modified',
-#     lineterm=''
-# )
-# print("Changes:")
-# for line in diff:
-#     print(line)
-'''
-
-            # Encode the Python code to base64
-            code_base64 = base64.b64encode(python_code.encode('utf-8')).decode('ascii')
 
             # Function to safely quote strings in bash
             def bash_single_quote(s):
@@ -391,14 +398,19 @@ print(f"Successfully replaced string in `" + path + "`.")
             escaped_old_str_base64 = bash_single_quote(old_str_base64)
             escaped_new_str_base64 = bash_single_quote(new_str_base64)
 
-            # Build the command to execute inside the container
-            command = (
-                f"echo {bash_single_quote(code_base64)} | base64 -d | "
-                f"python3 - {escaped_path} {escaped_old_str_base64} {escaped_new_str_base64}"
-            )
+            # Build the command to execute inside the container, installing the script on first use
+            run_command = f"python3 {STR_REPLACE_SCRIPT_PATH} {escaped_path} {escaped_old_str_base64} {escaped_new_str_base64}"
+            install_command = f"echo {bash_single_quote(STR_REPLACE_SCRIPT_BASE64)} | base64 -d > {STR_REPLACE_SCRIPT_PATH} && {run_command}"
+            command = run_command if self._str_replace_installed else install_command
 
             print(f"Executing command inside container: {command}")
             stdout, stderr, returncode = await self.execute_command_in_container(command)
+            if command is run_command and returncode == 2 and "can't open file" in stderr:
+                # The script is gone, e.g. the container was recreated; install it again
+                print(f"{STR_REPLACE_SCRIPT_PATH} is missing, installing it again")
+                stdout, stderr, returncode = await self.execute_command_in_container(install_command)
+            # Failed replacements, e.g. of a string that isn't found, still ran the installed script
+            self._str_replace_installed = not (returncode == 2 and "can't open file" in stderr)
             success = returncode == 0
 
             if success and not stderr.strip():
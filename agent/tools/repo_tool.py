@@ -1,17 +1,57 @@
 import asyncio
-import base64
+import logging
 import shlex
 import json
 import re
 import os
+import posixpath
+import secrets
 import tiktoken
+from collections import OrderedDict
+from functools import lru_cache
+from contextlib import asynccontextmanager
 from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
-from agentpress.state_manager import StateManager
-from typing import List, Optional
+from agentpress.state_manager import StateManager, StateManagerError
+from tools.bash_tool import BashTool, COMMAND_TIMEOUT, NO_OUTPUT_LIMIT, invalidate_command_cache
+from typing import Dict, List, Optional
+from xml.sax.saxutils import quoteattr
+
+# Whitespace allowed between </old_string> and <new_string>
+_WHITESPACE_RE = re.compile(r'\s*')
+
+# Top-level folders of /testbed that are not opened in a fresh workspace
+_EXCLUDE_DIRS = (
+    'tests', 'doc', 'docs', 'examples',
+    'utils', 'tools', 'egg-info', 'build', 'dist',
+    '__pycache__', '.git', '.github', 'licenses', 'scripts', 'script', 'extras', 'properties', 'asv', 'ci', 'extern', 'lib', 'galleries', 'requirements', 'tmp',
+    '.devcontainer', 'ext', '.binder', 'design_notes', 'bench', 'changelog', '.circleci', '.spin', 'benchmark', 'bin',
+    'data', 'release',
+)
+# Matches a folder containing any of the excluded names
+_EXCLUDE_RE = re.compile('|'.join(map(re.escape, _EXCLUDE_DIRS)))
+
+# Put between the head and the tail of long run_bash output
+_TRUNC_SEP = b'\n\n...LENGTHY OUTPUT TRUNCATED...\n\n'
+
+# Bytes of the git diff shown in the workspace
+_MAX_DIFF_BYTES = 512 * 1024
+
+# Most recent entries kept in the workspace's latest_failures and actions_taken lists
+_MAX_WORKSPACE_LOG = 200
+
+# Number of file contents edit_file remembers between edits
+_FILE_CACHE_SIZE = 16
+# `stat` output identifying a version of a file: size, full modification time and inode
+_FILE_STAMP_FORMAT = '%s %y %i'
+
+@lru_cache(maxsize=1)
+def _tokenizer():
+    """Load the cl100k_base encoding once instead of per open file."""
+    return tiktoken.get_encoding("cl100k_base")
 
 def transform_string_to_dict(input_string):
     """
-    Transform a string containing replacement tags into a dictionary format using regex.
+    Transform a string containing replacement tags into a dictionary format.
     
     Args:
         input_string (str): Input string with XML-like tags
@@ -19,84 +59,304 @@ def transform_string_to_dict(input_string):
     Returns:
         dict: Transformed dictionary with replacement information
     """
-    # Pattern to match old_string and new_string content
-    pattern = r'<old_string>(.*?)</old_string>\s*<new_string>(.*?)</new_string>'
-    
-    # Use re.DOTALL flag to make dot match newlines
-    matches = re.finditer(pattern, input_string, re.DOTALL)
-    
+    # The tags are located with str.find, which gives the same pairs as the lazy
+    # <old_string>(.*?)</old_string>\s*<new_string>(.*?)</new_string> pattern without backtracking
     replacements = []
-    for match in matches:
-        old_string = match.group(1)
-        new_string = match.group(2)
-        
-        replacement = {
-            "old_string": old_string,
-            "new_string": new_string
-        }
-        replacements.append(replacement)
-    
+    position = 0
+    while True:
+        old_start = input_string.find('<old_string>', position)
+        if old_start < 0:
+            break
+        # The old string ends at the first </old_string> that is followed by <new_string>
+        old_end = input_string.find('</old_string>', old_start + 12)
+        while old_end >= 0:
+            new_start = _WHITESPACE_RE.match(input_string, old_end + 13).end()
+            if input_string.startswith('<new_string>', new_start):
+                break
+            old_end = input_string.find('</old_string>', old_end + 1)
+        if old_end < 0:
+            break
+        new_end = input_string.find('</new_string>', new_start + 12)
+        if new_end < 0:
+            break
+        replacements.append({
+            "old_string": input_string[old_start + 12:old_end],
+            "new_string": input_string[new_start + 12:new_end],
+        })
+        position = new_end + 13
     return {"replacement": replacements}
 
+# Keys every workspace holds, with the type of their empty value
+_WORKSPACE_SCHEMA = {
+    "open_folders": dict,
+    "open_files": dict,
+    "last_terminal_session": list,
+    "latest_failures": list,
+    "actions_taken": list,
+    "implementation_trials": dict,
+}
+
+def _ensure_workspace_schema(workspace: dict) -> bool:
+    """Add the missing workspace keys so callers can index them directly.
+
+    Workspaces saved with open_files as a list are converted to the dict used as an
+    ordered set of paths. Returns whether the workspace was changed.
+    """
+    changed = False
+    for key, factory in _WORKSPACE_SCHEMA.items():
+        if workspace.get(key) is None:
+            workspace[key] = factory()
+            changed = True
+    if not isinstance(workspace["open_files"], dict):
+        workspace["open_files"] = dict.fromkeys(workspace["open_files"])
+        changed = True
+    return changed
+
+def _head_command(quoted_path: str, max_bytes: int, truncated_token: str) -> str:
+    """Return a command printing up to max_bytes of a file, then truncated_token on a new line if it is longer."""
+    return (
+        f'head -c {max_bytes} {quoted_path} && '
+        f'{{ [ "$(wc -c < {quoted_path})" -le {max_bytes} ] || printf "\\n%s" {truncated_token}; }}'
+    )
+
+def _append_capped(entries: list, *new_entries, limit: int = _MAX_WORKSPACE_LOG):
+    """Append to a list that keeps only its last `limit` entries."""
+    entries.extend(new_entries)
+    if len(entries) > limit:
+        del entries[:len(entries) - limit]
+
+def _replace_all(content: str, old_string: str, new_string: str) -> Optional[str]:
+    """Replace every occurrence of old_string, or return None if there is none.
+
+    Whether anything was replaced is read off the result, so the content is
+    only searched once unless the replacement is a no-op.
+    """
+    replaced = content.replace(old_string, new_string)
+    if len(old_string) != len(new_string):
+        found = len(replaced) != len(content)
+    elif old_string != new_string:
+        found = replaced != content
+    else:
+        found = old_string in content
+    return replaced if found else None
+
+def _replace_each(content: str, replacements: List[tuple]) -> tuple:
+    """Apply (old_string, new_string) pairs in order.
+
+    Returns:
+        tuple: (new content, None), or (None, old_string) for the first old_string not found
+    """
+    mapping = dict(replacements)
+    if (
+        len(replacements) > 1
+        and len(mapping) == len(replacements)
+        and all(mapping)
+        and not any(
+            old_string in other
+            for old_string in mapping
+            for other in (*mapping.values(), *(key for key in mapping if key != old_string))
+        )
+    ):
+        # Replace all of them in one regex pass when the order cannot matter: every match
+        # is at least one old_string length away from the next and no replacement forms a
+        # new match with the text around it. The lookahead also reports overlapping matches.
+        reach = max(map(len, mapping)) - 1
+        pattern = re.compile('(?=(' + '|'.join(map(re.escape, mapping)) + '))')
+        parts, position, found = [], None, set()
+        for match in pattern.finditer(content):
+            old_string, start = match.group(1), match.start()
+            if position is not None and start - position < reach:
+                break
+            new_string = mapping[old_string]
+            end = start + len(old_string)
+            surrounding = content[max(start - reach, 0):start] + new_string + content[end:end + reach]
+            if any(key in surrounding for key in mapping):
+                break
+            parts.append(content[position or 0:start])
+            parts.append(new_string)
+            position = end
+            found.add(old_string)
+        else:
+            if len(found) == len(mapping):
+                parts.append(content[position:])
+                return ''.join(parts), None
+
+    for old_string, new_string in replacements:
+        replaced = _replace_all(content, old_string, new_string)
+        if replaced is None:
+            return None, old_string
+        content = replaced
+    return content, None
+
+# Exit code of _REPLACE_IN_FILE_SCRIPT when old_string is not in the file
+_NOT_FOUND_EXIT_CODE = 3
+# Replaces every occurrence of old_string in a file inside the container, reading
+# {"path", "old_string", "new_string"} as JSON from stdin; the file is decoded like cat output
+_REPLACE_IN_FILE_SCRIPT = f'''import json, sys
+args = json.load(sys.stdin)
+try:
+    with open(args["path"], encoding="utf-8", errors="replace", newline="") as f:
+        content = f.read()
+    if args["old_string"] not in content:
+        sys.exit({_NOT_FOUND_EXIT_CODE})
+    with open(args["path"], "w", encoding="utf-8", newline="") as f:
+        f.write(content.replace(args["old_string"], args["new_string"]))
+except OSError as e:
+    sys.exit(str(e))
+'''
+
+def _read_host_file(path: str) -> str:
+    with open(path, encoding='utf-8', errors='replace', newline='') as f:
+        return f.read()
+
+def _write_host_file(path: str, content: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+
 class BashExecutor:
-    """Executes bash commands in Docker container using individual exec calls."""
+    """Executes bash commands in Docker container through a persistent bash session.
+
+    Commands that need stdin still get an individual exec call.
+    """
     
     def __init__(self, container_name: str):
         self.container_name = container_name
+        # Owns the persistent `docker exec` session; its state file is never used
+        self._bash_tool = BashTool(container_name, state_file=None)
         
+    async def aclose(self):
+        """Shut down the bash tool's session and connections."""
+        await self._bash_tool.aclose()
+
     async def execute(self, command: str, input_data: Optional[bytes] = None) -> tuple[str, str, int]:
-        """Execute a command in the container using docker exec."""
+        """Execute a command in the container."""
         try:
-            # Ensure we're in /testbed and have conda environment
-            wrapped_command = (
-                f'. /opt/miniconda3/etc/profile.d/conda.sh && '
-                f'conda activate testbed && '
-                f'cd /testbed && '
-                f'set -o pipefail && '
-                f'{command}'
-            )
-            
-            # Use docker exec directly for each command
-            cmd = [
-                'docker', 'exec',
-                '-i',  # Interactive mode
-                self.container_name,
-                '/bin/bash', '-c', wrapped_command
-            ]
+            try:
+                stdout, stderr, returncode = await self._run(command, input_data)
+            except asyncio.TimeoutError:
+                return '', f'Command execution timed out after {COMMAND_TIMEOUT} seconds', 1
+                
+            # Decode outputs with UTF-8 encoding and replace errors
+            stdout_str = stdout.decode('utf-8', errors='replace').strip() if stdout else ''
+            stderr_str = stderr.decode('utf-8', errors='replace').strip() if stderr else ''
             
+            # Handle empty output
+            if not stdout_str and not stderr_str and returncode == 0:
+                stdout_str = "Command completed successfully but produced no output"
+                
+            return stdout_str, stderr_str, returncode
+                
+        except Exception as e:
+            return '', f"Error executing command: {str(e)}", 1
+
+    async def execute_raw(self, command: str, output_limit: Optional[int] = None) -> tuple[bytes, bytes, int]:
+        """Execute a command in the container, returning its output as undecoded bytes.
+
+        With output_limit, only that many bytes from the head and from the tail of stdout
+        and of stderr are kept while the output is read; the middle is dropped.
+        """
+        return await self._bash_tool.execute_command_raw(command, output_limit)
+
+    async def execute_many(self, commands: List[str]) -> List[tuple[str, int]]:
+        """Run read-only commands as a single script.
+
+        Each command runs in its own subshell with stderr merged into stdout,
+        followed by a sentinel line carrying its exit code. The combined output
+        is read in full, so callers bound the output of each command themselves.
+
+        Returns:
+            list: (stripped output, returncode) for each command, in order
+        """
+        token = secrets.token_hex(16)
+        script = ''.join(
+            f'( {command}\n) 2>&1; printf "\\n%s %d\\n" {token} $?; '
+            for command in commands
+        )
+        try:
+            stdout, stderr, returncode = await self._run(script)
+        except asyncio.TimeoutError:
+            return [(f'Command execution timed out after {COMMAND_TIMEOUT} seconds', 1)] * len(commands)
+        except Exception as e:
+            return [(f"Error executing command: {str(e)}", 1)] * len(commands)
+        output = stdout.decode('utf-8', errors='replace')
+
+        marker = f'\n{token} '
+        error = stderr.decode('utf-8', errors='replace').strip()
+        if output.count(marker) != len(commands):
+            # Without a sentinel for every command, outputs can't be told apart;
+            # this happens when the script failed early
+            return [(error or "Error executing command: incomplete output", returncode or 1)] * len(commands)
+
+        results = []
+        start = 0
+        for _ in commands:
+            index = output.find(marker, start)
+            end = output.find('\n', index + len(marker))
+            results.append((output[start:index].strip(), int(output[index + len(marker):end])))
+            start = end + 1
+        return results
+
+    async def _run(self, command: str, input_data: Optional[bytes] = None):
+        """Run a command from /testbed with the conda environment active.
+
+        Commands without input go through the bash tool's session, which also
+        takes care of its read-only command cache. Their output is read in full,
+        since callers parse it or write file contents back.
+
+        Returns:
+            tuple: (stdout bytes, stderr bytes, returncode)
+
+        Raises:
+            asyncio.TimeoutError: If the command takes more than COMMAND_TIMEOUT seconds
+        """
+        if not input_data:
+            return await self._bash_tool.execute_command_raw(command, NO_OUTPUT_LIMIT)
+
+        # Ensure we're in /testbed and have conda environment
+        wrapped_command = (
+            f'. /opt/miniconda3/etc/profile.d/conda.sh && '
+            f'conda activate testbed && '
+            f'cd /testbed && '
+            f'set -o pipefail && '
+            f'{command}'
+        )
+
+        # Use docker exec directly to pass the input on
+        cmd = [
+            'docker', 'exec',
+            '-i',  # Interactive mode
+            self.container_name,
+            '/bin/bash', '-c', wrapped_command
+        ]
+        
+        # Writes through stdin change files behind the bash tool's back; the cache is
+        # cleared again afterwards so reads that finished during the write aren't kept
+        invalidate_command_cache(self.container_name)
+        try:
             # Execute the command
             process = await asyncio.create_subprocess_exec(
                 *cmd,
-                stdin=asyncio.subprocess.PIPE if input_data else None,
+                stdin=asyncio.subprocess.PIPE,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
-            
+
             # Wait for command completion with timeout
             try:
                 stdout, stderr = await asyncio.wait_for(
                     process.communicate(input=input_data),
-                    timeout=120  # 2 minute timeout
+                    timeout=COMMAND_TIMEOUT
                 )
             except asyncio.TimeoutError:
                 try:
                     process.terminate()
                 except:
                     pass
-                return '', 'Command execution timed out after 2 minutes', 1
-                
-            # Decode outputs with UTF-8 encoding and replace errors
-            stdout_str = stdout.decode('utf-8', errors='replace').strip() if stdout else ''
-            stderr_str = stderr.decode('utf-8', errors='replace').strip() if stderr else ''
-            
-            # Handle empty output
-            if not stdout_str and not stderr_str and process.returncode == 0:
-                stdout_str = "Command completed successfully but produced no output"
-                
-            return stdout_str, stderr_str, process.returncode
-                
-        except Exception as e:
-            return '', f"Error executing command: {str(e)}", 1
+                raise
+            return stdout, stderr, process.returncode
+        finally:
+            invalidate_command_cache(self.container_name)
 
 class RepositoryTools(Tool):
     def __init__(self, container_name: str, state_manager: StateManager):
@@ -104,84 +364,177 @@ class RepositoryTools(Tool):
         self.state_manager = state_manager
         self.container_name = container_name
         self._bash_executor = BashExecutor(container_name)
+        self._mounts: Optional[Dict[str, str]] = None  # Bind mounts as {container path: host path}
+        self._pending_failures: List[str] = []  # Failure messages not yet added to the workspace
+        self._failure_task: Optional[asyncio.Task] = None
+        self._file_cache: OrderedDict = OrderedDict()  # {path: (stat stamp, content)} of files read or written in the container
+        # Workspace shared by the nested operations of one top-level call, see _workspace_txn
+        self._ws_cache: Optional[dict] = None
+        self._ws_depth = 0
+        self._ws_dirty = False
+        self._ws_lock = asyncio.Lock()
+
+    async def _read_cached(self, path: str) -> tuple[Optional[str], str]:
+        """Read a file in the container, reusing the last content read or written if it is unchanged.
+
+        The file's stat stamp is always checked; the content is only sent over when it differs,
+        followed by an "x" so that its trailing whitespace survives the output stripping.
+
+        Returns:
+            tuple: (content or None, stderr)
+        """
+        quoted_path = shlex.quote(path)
+        cached_stamp, content = self._file_cache.get(path, (None, None))
+        command = (
+            f"stamp=$(stat -c '{_FILE_STAMP_FORMAT}' {quoted_path}) && printf '%s\\n' \"$stamp\" && "
+            f"{{ [ \"$stamp\" = {shlex.quote(cached_stamp or '')} ] || {{ cat {quoted_path} && printf x; }}; }}"
+        )
+        stdout, stderr, returncode = await self._bash_executor.execute(command)
+        if returncode != 0:
+            self._file_cache.pop(path, None)
+            return None, stderr
+        stamp, _, stdout = stdout.partition('\n')
+        if stamp != cached_stamp:
+            content = stdout[:-1]
+        self._remember_file(path, stamp, content)
+        return content, stderr
+
+    def _remember_file(self, path: str, stamp: str, content: str):
+        self._file_cache[path] = (stamp, content)
+        self._file_cache.move_to_end(path)
+        if len(self._file_cache) > _FILE_CACHE_SIZE:
+            self._file_cache.popitem(last=False)
+
+    @asynccontextmanager
+    async def _workspace_txn(self):
+        """Load the workspace once for a top-level operation and write it back once at the end.
+
+        Nested or concurrent transactions share the same dict, so the state file is read
+        when the outermost one starts and written only if something called _workspace_changed.
+        """
+        async with self._ws_lock:
+            if self._ws_depth == 0:
+                self._ws_cache = await self.state_manager.get("workspace")
+                self._ws_dirty = False
+                if self._ws_cache is not None:
+                    # Another tool instance may have stored the workspace in an older shape
+                    self._ws_dirty = _ensure_workspace_schema(self._ws_cache)
+            self._ws_depth += 1
+        try:
+            yield self._ws_cache
+        finally:
+            async with self._ws_lock:
+                self._ws_depth -= 1
+                if self._ws_depth == 0:
+                    if self._ws_dirty:
+                        await self.state_manager.set("workspace", self._ws_cache)
+                    self._ws_cache = None
+
+    async def _update_workspace(self, mutator, persist=None):
+        """Change the workspace in place with mutator and return its result.
+
+        Inside a transaction the shared workspace is changed. Otherwise persist(), if given,
+        stores the same change through a granular state manager call, or else the state
+        manager loads, mutates and stores the workspace once.
+
+        Raises:
+            StateManagerError: If there is no workspace yet, or the state store fails
+        """
+        def normalized_mutator(workspace):
+            _ensure_workspace_schema(workspace)
+            return mutator(workspace)
+
+        async with self._ws_lock:
+            if self._ws_depth:
+                if self._ws_cache is None:
+                    raise StateManagerError("No data stored for key: workspace")
+                result = mutator(self._ws_cache)
+                self._ws_dirty = True
+                return result
+            if persist is not None:
+                return await persist()
+            return await self.state_manager.update("workspace", normalized_mutator)
+
+    def _workspace_changed(self, workspace: Optional[dict] = None):
+        """Mark the workspace of the current transaction to be saved, replacing it if given."""
+        if workspace is not None:
+            _ensure_workspace_schema(workspace)
+            self._ws_cache = workspace
+        self._ws_dirty = True
+
+    async def _host_path(self, path: str) -> Optional[str]:
+        """Map a container path to the host when it lives on a bind mount the agent can reach.
+
+        The container's mounts are looked up once with `docker inspect`.
+        """
+        if self._mounts is None:
+            self._mounts = {}
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    'docker', 'inspect',
+                    '--format', '{{range .Mounts}}{{if eq .Type "bind"}}{{.Destination}}={{.Source}}\n{{end}}{{end}}',
+                    self.container_name,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+                stdout, _ = await process.communicate()
+            except OSError:
+                return None
+            if process.returncode == 0:
+                for line in stdout.decode('utf-8', errors='replace').splitlines():
+                    destination, _, source = line.partition('=')
+                    if source and os.path.isdir(source):
+                        self._mounts[destination.rstrip('/') or '/'] = source
+
+        # Commands run from /testbed, so relative paths are relative to it
+        path = posixpath.normpath(posixpath.join('/testbed', path))
+        for destination, source in sorted(self._mounts.items(), key=lambda mount: len(mount[0]), reverse=True):
+            if path == destination or path.startswith(destination.rstrip('/') + '/'):
+                return os.path.join(source, path[len(destination):].lstrip('/'))
+        return None
 
     async def _init_workspace(self):
         """Initialize the workspace state with empty structures if not already initialized."""
-        workspace = await self.state_manager.get("workspace")
-        if workspace is None:
-            workspace = {
-                "open_folders": {},        # Dictionary with folder paths as keys and depths as values
-                "open_files": [],          # List of paths to open files
-                "last_terminal_session": [],    # Current terminal session output (last N commands)
-            }
-            
-            # Find and add only main source code folders with depth 3
-            exclude_dirs = ['tests', 'doc', 'docs', 'examples', 
-                            'utils', 'tools', 'egg-info', 'build', 'dist',
-                            '__pycache__', '.git', '.github', 'licenses', 'scripts', 'script', 'extras', 'properties', 'asv', 'ci', 'extern', 'lib', 'galleries', 'requirements', 'tmp',
-                            '.devcontainer', 'ext', '.binder', 'design_notes', 'bench', 'changelog', '.circleci', '.spin' , 'benchmark', 'bin',
-                            'data', 'release'
-                            ]
-            
-            # Command to list directories in /testbed
-            cmd = 'ls -d /testbed/*/'
-            stdout, stderr, returncode = await self._bash_executor.execute(cmd)
-            
-            folders = [f for f in stdout.splitlines() if not any(exclude_dir in f for exclude_dir in exclude_dirs)]
+        async with self._workspace_txn() as workspace:
+            if workspace is None:
+                workspace = {
+                    "open_folders": {},        # Dictionary with folder paths as keys and depths as values
+                    "open_files": {},          # Paths of open files as keys, in the order they were opened
+                    "last_terminal_session": [],    # Current terminal session output (last N commands)
+                }
+                
+                # Command to list directories in /testbed
+                cmd = 'ls -d /testbed/*/'
+                stdout, stderr, returncode = await self._bash_executor.execute(cmd)
+                
+                # Find and add only main source code folders with depth 3
+                folders = [f for f in stdout.splitlines() if not _EXCLUDE_RE.search(f)]
 
-            # Add initial view of /testbed with depth 1
-            workspace["open_folders"]["/testbed"] = 1
+                # Add initial view of /testbed with depth 1
+                workspace["open_folders"]["/testbed"] = 1
 
-            # Check if tests/ is a folder of /testbed and add it with depth 1
-            if '/testbed/tests/' in folders:
-                workspace["open_folders"]["/testbed/tests"] = 2
+                # Check if tests/ is a folder of /testbed and add it with depth 1
+                if '/testbed/tests/' in folders:
+                    workspace["open_folders"]["/testbed/tests"] = 2
 
-            if len(folders) == 1:
-                workspace["open_folders"][folders[0]] = 2
-            else: 
-                self.fail_response(f"Error finding main source code folder: {stderr}")
-            
-            await self.state_manager.set("workspace", workspace)
+                if len(folders) == 1:
+                    workspace["open_folders"][folders[0]] = 2
+                else: 
+                    self.fail_response(f"Error finding main source code folder: {stderr}")
+                
+                self._workspace_changed(workspace)
 
     async def _update_terminal(self, command: str, output: Optional[str] = None, success: Optional[bool] = None):
         """Update terminal session with new command and optionally outputs."""
-        workspace = await self.state_manager.get("workspace")
-        if "last_terminal_session" not in workspace:
-            workspace["last_terminal_session"] = []
-        # Add new command to terminal session
-        workspace["last_terminal_session"].append({
-            "command": command,
-            "output": output,
-            "success": success,
-        })
-        await self.state_manager.set("workspace", workspace)
-
-    async def execute_command_in_container(self, command: str):
-        """
-        Executes a given bash command inside the specified Docker container.
-        
-        Parameters:
-            command (str): The bash command to execute.
-        
-        Returns:
-            tuple: (stdout, stderr, returncode)
-        """
-        # MUST keep this env activation command
-        full_command = (
-            f'. /opt/miniconda3/etc/profile.d/conda.sh && '
-            f'conda activate testbed && {command}'
-        )
-        cmd = ['docker', 'exec', self.container_name, 'bash', '-c', full_command]
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-        # Decode outputs with UTF-8 encoding and replace errors
-        stdout_decoded = stdout.decode('utf-8', errors='replace')
-        stderr_decoded = stderr.decode('utf-8', errors='replace')
-        return stdout_decoded, stderr_decoded, process.returncode
+        async with self._workspace_txn() as workspace:
+            # Add new command to terminal session
+            workspace["last_terminal_session"].append({
+                "command": command,
+                "output": output,
+                "success": success,
+            })
+            self._workspace_changed()
 
     async def _extract_file_content(self, output: str) -> str:
         """Extract file content from view output."""
@@ -202,130 +555,107 @@ class RepositoryTools(Tool):
 
     async def format_workspace_xml(self) -> str:
         """Format the workspace into an XML string for the Agent."""
-        workspace = await self.state_manager.get("workspace")
-        xml_output = "<workspace>\n"
-        # Include content from open folders with their specified depths
-        for path, depth in workspace["open_folders"].items():
-            result = await self._fetch_folder_contents(path=path, depth=depth)
-            if result.success:
-                xml_output += f"{result.output}\n"
-
-        if "implementation_trials" in workspace:
-            xml_output += "<IMPLEMENTATION_TRAILS>\n"
-            for trial_id, data in workspace["implementation_trials"].items():
-                status = data.get("status", "")
-                note = data.get("note", "")
-                xml_output += f'<implementation_trial id="{trial_id}" status="{status}">\n{note}\n</implementation_trial>\n'
-            xml_output += "</IMPLEMENTATION_TRAILS>\n"
-
-        # use reversed order because we want important files to be at the end
-        debug_files = []
-        for file_path in reversed(workspace["open_files"]):
-            command = f"cat {file_path}"
-            stdout, stderr, returncode = await self._bash_executor.execute(command)
-            if returncode == 0:
+        async with self._workspace_txn() as workspace:
+            parts = ["<workspace>\n"]
+            # use reversed order because we want important files to be at the end
+            open_files = list(reversed(workspace["open_files"]))
+            # Files are only read up to their size limit; a token after the content marks a cut-off file
+            truncated_token = secrets.token_hex(16)
+            file_commands = []
+            for file_path in open_files:
                 # remove (/testbed)
-                MAX_LENGTH = 30000 if "test" in file_path[9:] else 100000
-                if len(stdout) > MAX_LENGTH:
-                    stdout = stdout[:MAX_LENGTH] + "\n... File content truncated due to length ... \n"
-                xml_output += f'<file path="{file_path}">\n{stdout}\n</file>\n'
-                debug_files.append((file_path, len(tiktoken.get_encoding("cl100k_base").encode(stdout))))
-            else:
-                xml_output += f'<!-- Error reading file {file_path}: {stderr} -->\n'
-
-        # add <current_changes> (result of "git diff")
-        stdout, stderr, returncode = await self._bash_executor.execute('git diff')
-        xml_output += f"<last_try>\n" 
-        xml_output += "<last_terminal_session>\n"
-        for session_entry in workspace.get("last_terminal_session", []):
-            xml_output += f"<bash_command_executed command=\"{session_entry['command']}\">\n"
-            xml_output += f"{session_entry['output']}\n"
-            xml_output += "</bash_command_executed>\n"
-
-        if "latest_failures" in workspace and workspace["latest_failures"]:
-            xml_output += "<latest_failures>\n"
-            for failure_message in workspace["latest_failures"]:
-                xml_output += f"<failure>{failure_message}</failure>\n"
-            xml_output += "</latest_failures>\n"
-            workspace["latest_failures"] = []
-            await self.state_manager.set("workspace", workspace)
-        xml_output += "</last_terminal_session>\n"
-        xml_output += f"<git_diff>{stdout}</git_diff>\n"
-        xml_output += "</last_try>\n"
-
-        xml_output += "</workspace>\n"
-
-        # reset terminal session
-        workspace["last_terminal_session"] = []
-
-        return xml_output
+                max_bytes = 30000 if "test" in file_path[9:] else 100000
+                file_commands.append(_head_command(shlex.quote(file_path), max_bytes, truncated_token))
+            # The diff is bounded the same way, through a temporary file
+            read_diff = _head_command('"$diff_file"', _MAX_DIFF_BYTES, truncated_token)
+            diff_command = (
+                f'diff_file=$(mktemp) && git diff > "$diff_file" && {read_diff}; '
+                f'status=$?; rm -f "$diff_file"; exit $status'
+            )
+            # Folder listings, open files and the current changes are fetched concurrently;
+            # all open files and the git diff are read in one docker exec
+            folder_results, results = await asyncio.gather(
+                asyncio.gather(*(
+                    self._fetch_folder_contents(path=path, depth=depth)
+                    for path, depth in workspace["open_folders"].items()
+                )),
+                self._bash_executor.execute_many(
+                    file_commands + [diff_command]
+                )
+            )
+
+            # Include content from open folders with their specified depths
+            for result in folder_results:
+                if result.success:
+                    parts.append(f"{result.output}\n")
+
+            if workspace["implementation_trials"]:
+                parts.append("<IMPLEMENTATION_TRAILS>\n")
+                for trial_id, data in workspace["implementation_trials"].items():
+                    status = data.get("status", "")
+                    note = data.get("note", "")
+                    parts.append(f'<implementation_trial id={quoteattr(trial_id)} status={quoteattr(status)}>\n{note}\n</implementation_trial>\n')
+                parts.append("</IMPLEMENTATION_TRAILS>\n")
+
+            # Token counts per open file are only computed on request, encoding is expensive
+            count_tokens = bool(os.environ.get("DEBUG_TOKEN_COUNTS"))
+            for file_path, (stdout, returncode) in zip(open_files, results):
+                if returncode == 0:
+                    if stdout.endswith(truncated_token):
+                        stdout = stdout[:-len(truncated_token) - 1] + "\n... File content truncated due to length ... \n"
+                    parts.append(f'<file path={quoteattr(file_path)}>\n{stdout}\n</file>\n')
+                    if count_tokens:
+                        logging.debug(f"Workspace file {file_path}: {len(_tokenizer().encode(stdout))} tokens")
+                else:
+                    parts.append(f'<!-- Error reading file {file_path}: {stdout} -->\n')
+
+            # add <current_changes> (result of "git diff")
+            stdout, returncode = results[-1]
+            if stdout.endswith(truncated_token):
+                stdout = stdout[:-len(truncated_token) - 1] + "\n... Diff truncated due to length ... \n"
+            parts.append(f"<last_try>\n")
+            parts.append("<last_terminal_session>\n")
+            for session_entry in workspace["last_terminal_session"]:
+                parts.append(f"<bash_command_executed command={quoteattr(session_entry['command'])}>\n")
+                parts.append(f"{session_entry['output']}\n")
+                parts.append("</bash_command_executed>\n")
+
+            if workspace["latest_failures"]:
+                parts.append("<latest_failures>\n")
+                for failure_message in workspace["latest_failures"]:
+                    parts.append(f"<failure>{failure_message}</failure>\n")
+                parts.append("</latest_failures>\n")
+                workspace["latest_failures"] = []
+                self._workspace_changed()
+            parts.append("</last_terminal_session>\n")
+            parts.append(f"<git_diff>{stdout}</git_diff>\n")
+            parts.append("</last_try>\n")
+
+            parts.append("</workspace>\n")
+
+            return "".join(parts)
 
     async def _fetch_folder_contents(self, path: str, depth: Optional[int]) -> ToolResult:
         """Fetch the contents of a folder."""
         try:
-            exclude_patterns = ['.rst', '.pyc']
-            python_code = '''
-import os
-import fnmatch
-import sys
-from typing import List
-
-def should_exclude(path: str, patterns: List[str]) -> bool:
-    return any(fnmatch.fnmatch(path, f"*{pattern}") for pattern in patterns)
-
-def list_directory(root_path: str, depth: int, exclude_patterns: List[str], current_depth: int = 1) -> List[str]:
-    results = []
-    try:
-        for item in sorted(os.listdir(root_path)):
-            if item.startswith('.'):
-                continue
-                
-            full_path = os.path.join(root_path, item)
-            if should_exclude(full_path, exclude_patterns):
-                continue
-                
-            results.append(full_path)
-            if os.path.isdir(full_path) and current_depth < depth:
-                results.extend(list_directory(full_path, depth, exclude_patterns, current_depth + 1))
-    except PermissionError:
-        print(f"Permission denied: {root_path}", file=sys.stderr)
-    except Exception as e:
-        print(f"Error accessing {root_path}: {str(e)}", file=sys.stderr)
-    return results
-
-def view_path(path: str, depth: int, exclude_patterns: List[str]):
-    if os.path.isdir(path):
-        print(f'<directory path="{path}">')
-        for item in list_directory(path, depth, exclude_patterns):
-            print(item)
-        print('</directory>')
-    else:
-        print(f"The path '{path}' is not a directory.", file=sys.stderr)
-
-def main():
-    path = sys.argv[1]
-    exclude_patterns = sys.argv[2].split(',')
-    depth = int(sys.argv[3])
-    view_path(path.strip(), depth, exclude_patterns)
-
-if __name__ == '__main__':
-    main()
-'''
-            # Encode the Python script and arguments
-            code_base64 = base64.b64encode(python_code.encode('utf-8')).decode('ascii')
-            exclude_str = ','.join(exclude_patterns)
-            # Command to execute the Python script in the container
+            path = path.strip()
+            quoted_path = shlex.quote(path)
+            not_a_directory = shlex.quote(f"The path '{path}' is not a directory.")
+            # Hidden entries and excluded patterns are pruned, so their contents are skipped too
             command = (
-                f"echo {repr(code_base64)} | base64 -d | "
-                f"python3 - {repr(path)} {repr(exclude_str)} {depth}"
+                f"if [ -d {quoted_path} ]; then "
+                f"find {quoted_path} -mindepth 1 -maxdepth {int(depth)} "
+                f"\\( -name '.*' -o -name '*.rst' -o -name '*.pyc' \\) -prune -o -print; "
+                f"else echo {not_a_directory}; exit 1; fi"
             )
-            stdout, stderr, returncode = await self.execute_command_in_container(command)
-            success = returncode == 0
+            [(output, returncode)] = await self._bash_executor.execute_many([command])
 
-            if success and not stderr.strip():
-                return self.success_response(stdout.strip())
+            if returncode == 0:
+                # Each directory's sorted entries follow it, as in a depth-first listing
+                items = sorted(output.splitlines(), key=lambda item: item.split('/'))
+                return self.success_response('\n'.join([f'<directory path={quoteattr(path)}>', *items, '</directory>']))
             else:
-                return self.fail_response(f"Error fetching folder contents: {stderr.strip()}")
+                return self.fail_response(f"Error fetching folder contents: {output}")
         except Exception as e:
             return self.fail_response(f"Exception during folder content fetch: {str(e)}")
 
@@ -380,15 +710,13 @@ if __name__ == '__main__':
     async def view_folder(self, path: str, depth: Optional[int] = 2) -> ToolResult:
         """Add a directory to the workspace to view its contents."""
         try:
-            workspace = await self.state_manager.get("workspace")
-            if "open_folders" not in workspace:
-                workspace["open_folders"] = {}
-            if path not in workspace["open_folders"]:
-                workspace["open_folders"][path] = depth or 2
-                await self.state_manager.set("workspace", workspace)
-                return self.success_response(f"Folder {path} added to workspace.")
-            else:
-                return self.success_response(f"Folder {path} is already open in the workspace.")
+            async with self._workspace_txn() as workspace:
+                if path not in workspace["open_folders"]:
+                    workspace["open_folders"][path] = depth or 2
+                    self._workspace_changed()
+                    return self.success_response(f"Folder {path} added to workspace.")
+                else:
+                    return self.success_response(f"Folder {path} is already open in the workspace.")
         except Exception as e:
             return self.fail_response(f"Error adding folder {path} to workspace: {str(e)}")
 
@@ -469,7 +797,7 @@ if __name__ == '__main__':
     #             await self.state_manager.set("workspace", workspace)
     #             return self.success_response(f"Folder {path} closed successfully.")
     #         elif path in workspace["open_files"]:
-    #             workspace["open_files"].remove(path)
+    #             del workspace["open_files"][path]
     #             await self.state_manager.set("workspace", workspace)
     #             return self.success_response(f"File {path} closed successfully.")
     #         else:
@@ -513,20 +841,34 @@ print("Hello, World!")
     )
     async def create_file(self, path: str, content: str) -> ToolResult:
         try:
-            # Ensure the directory exists before creating the file
-            command = (
-                f"mkdir -p $(dirname {shlex.quote(path)}) && "
-                f"echo {shlex.quote(content)} > {shlex.quote(path)}"
-            )
-            stdout, stderr, returncode = await self._bash_executor.execute(command)
+            # Files keep the trailing newline they had when written with echo
+            content += '\n'
+            host_path = await self._host_path(path)
+            if host_path is not None:
+                # Write straight to the bind-mounted file
+                try:
+                    await asyncio.to_thread(_write_host_file, host_path, content)
+                    stderr, returncode = '', 0
+                except OSError as e:
+                    stderr, returncode = str(e), 1
+                invalidate_command_cache(self.container_name)
+            else:
+                # Ensure the directory exists before creating the file; the content is piped to cat
+                command = (
+                    f"mkdir -p $(dirname {shlex.quote(path)}) && cat > {shlex.quote(path)} && "
+                    f"stat -c '{_FILE_STAMP_FORMAT}' {shlex.quote(path)}"
+                )
+                stdout, stderr, returncode = await self._bash_executor.execute(command, input_data=content.encode('utf-8'))
+                if returncode == 0:
+                    self._remember_file(path, stdout, content)
+                else:
+                    self._file_cache.pop(path, None)
             if returncode == 0:
                 # Add to open_files
-                workspace = await self.state_manager.get("workspace")
-                if "open_files" not in workspace:
-                    workspace["open_files"] = []
-                if path not in workspace["open_files"]:
-                    workspace["open_files"].append(path)
-                    await self.state_manager.set("workspace", workspace)
+                async with self._workspace_txn() as workspace:
+                    if path not in workspace["open_files"]:
+                        workspace["open_files"][path] = None
+                        self._workspace_changed()
                 return self.success_response(f"File {path} created successfully.")
             else:
                 return self.fail_response(f"Failed to create file {path}: {stderr}")
@@ -594,18 +936,11 @@ print("Hello, World!")
         """Edit an existing file by replacing specified strings."""
         try:
             # Ensure the file is open in the workspace
-            workspace = await self.state_manager.get("workspace")
-            if "open_files" not in workspace or path not in workspace["open_files"]:
+            async with self._workspace_txn() as workspace:
+                is_open = path in workspace["open_files"]
+            if not is_open:
                 return self.fail_response(f"File {path} is not open. Please open the file before editing.")
 
-            # Read the current content from the file system
-            command = f"cat {shlex.quote(path)}"
-            stdout, stderr, returncode = await self._bash_executor.execute(command)
-            if returncode != 0:
-                return self.fail_response(f"Failed to read file {path}: {stderr.strip()}")
-
-            content = stdout
-
             # Process the replacements
             replacements_list = []
 
@@ -637,25 +972,65 @@ print("Hello, World!")
             if not replacements_list:
                 return self.fail_response("No valid replacements provided.")
 
-            # Apply replacements
+            # Check the replacements
+            pairs = []
             for rep in replacements_list:
                 if isinstance(rep, dict) and 'old_string' in rep and 'new_string' in rep:
                     old_string = rep['old_string']
                     new_string = rep['new_string']
                     if not isinstance(old_string, str) or not isinstance(new_string, str):
                         return self.fail_response("Both 'old_string' and 'new_string' must be strings.")
-                    if old_string not in content:
-                        return self.fail_response(f"The string to replace '{old_string}' was not found in the file. Please check your old_string: Indentation really matters! When editing a file, make sure to insert appropriate indentation before each line!")
-                    content = content.replace(old_string, new_string)
+                    pairs.append((old_string, new_string))
                 else:
                     return self.fail_response("Invalid replacement format in one of the replacements.")
 
+            host_path = await self._host_path(path)
+            if host_path is None and len(pairs) == 1:
+                # A single replacement is made by python inside the container, so the file
+                # content does not have to travel through docker exec twice
+                old_string, new_string = pairs[0]
+                input_data = json.dumps({"path": path, "old_string": old_string, "new_string": new_string}).encode('utf-8')
+                command = f"python3 -c {shlex.quote(_REPLACE_IN_FILE_SCRIPT)}"
+                stdout, stderr, returncode = await self._bash_executor.execute(command, input_data=input_data)
+                self._file_cache.pop(path, None)
+                if returncode == _NOT_FOUND_EXIT_CODE:
+                    return self.fail_response(f"The string to replace '{old_string}' was not found in the file. Please check your old_string: Indentation really matters! When editing a file, make sure to insert appropriate indentation before each line!")
+                if returncode != 0:
+                    return self.fail_response(f"Failed to edit file {path}: {stderr.strip()}")
+                return self.success_response(f"File {path} edited successfully.")
+
+            # Read the current content from the file system, directly if it is bind-mounted
+            if host_path is not None:
+                try:
+                    content = await asyncio.to_thread(_read_host_file, host_path)
+                except OSError as e:
+                    return self.fail_response(f"Failed to read file {path}: {e}")
+            else:
+                content, stderr = await self._read_cached(path)
+                if content is None:
+                    return self.fail_response(f"Failed to read file {path}: {stderr.strip()}")
+
+            # Apply replacements
+            content, old_string = _replace_each(content, pairs)
+            if content is None:
+                return self.fail_response(f"The string to replace '{old_string}' was not found in the file. Please check your old_string: Indentation really matters! When editing a file, make sure to insert appropriate indentation before each line!")
+
             # Write the updated content back to the file
-            input_data = content.encode('utf-8')
-            command = f"cat > {shlex.quote(path)}"
-            stdout, stderr, returncode = await self._bash_executor.execute(command, input_data=input_data)
-            if returncode != 0:
-                return self.fail_response(f"Failed to write to file {path}: {stderr.strip()}")
+            if host_path is not None:
+                try:
+                    await asyncio.to_thread(_write_host_file, host_path, content)
+                except OSError as e:
+                    return self.fail_response(f"Failed to write to file {path}: {e}")
+                finally:
+                    invalidate_command_cache(self.container_name)
+            else:
+                input_data = content.encode('utf-8')
+                command = f"cat > {shlex.quote(path)} && stat -c '{_FILE_STAMP_FORMAT}' {shlex.quote(path)}"
+                stdout, stderr, returncode = await self._bash_executor.execute(command, input_data=input_data)
+                if returncode != 0:
+                    self._file_cache.pop(path, None)
+                    return self.fail_response(f"Failed to write to file {path}: {stderr.strip()}")
+                self._remember_file(path, stdout, content)
 
             return self.success_response(f"File {path} edited successfully.")
         except Exception as e:
@@ -701,23 +1076,27 @@ print("Hello, World!")
     async def _execute_command(self, command: str) -> ToolResult:
         """Execute a shell command and update the terminal session."""
         try:
-            stdout, stderr, returncode = await self._bash_executor.execute(command)
-            success = returncode == 0
-            
             MAX_OUTPUT = 15000  
             KEEP_HEAD = 5000   
             KEEP_TAIL = 10000   
             
-            combined_output = stdout + stderr
-            if not combined_output:
-                combined_output = "Command completed successfully but produced no output"
-                
-            if len(combined_output) > MAX_OUTPUT:
-                head = combined_output[:KEEP_HEAD]
-                tail = combined_output[-KEEP_TAIL:]
-                truncated_output = head + '\n\n...LENGTHY OUTPUT TRUNCATED...\n\n' + tail
+            # Output is already capped while it is read: with MAX_OUTPUT bytes from each end
+            # of both streams, the kept head and tail below are the same as for the full output
+            stdout, stderr, returncode = await self._bash_executor.execute_raw(command, output_limit=MAX_OUTPUT)
+            stdout, stderr = stdout.strip(), stderr.strip()
+            success = returncode == 0
+            
+            # Sizes are in bytes; of long output only the kept head and tail are copied and decoded
+            total = len(stdout) + len(stderr)
+            if not total:
+                truncated_output = "Command completed successfully but produced no output"
+            elif total > MAX_OUTPUT:
+                stdout_view, stderr_view = memoryview(stdout), memoryview(stderr)
+                head = [stdout_view[:KEEP_HEAD], stderr_view[:max(KEEP_HEAD - len(stdout), 0)]]
+                tail = [stdout_view[max(total - KEEP_TAIL, 0):], stderr_view[max(len(stderr) - KEEP_TAIL, 0):]]
+                truncated_output = b''.join([*head, _TRUNC_SEP, *tail]).decode('utf-8', errors='replace')
             else:
-                truncated_output = combined_output
+                truncated_output = (stdout + stderr).decode('utf-8', errors='replace')
                 
             await self._update_terminal(command, truncated_output, success)
             return self.success_response(f"Command executed:\n{truncated_output}")
@@ -725,32 +1104,40 @@ print("Hello, World!")
         except Exception as e:
             return self.fail_response(f"Error executing command: {str(e)}")
 
-    def success_response(self, message: str) -> ToolResult:
-        result = super().success_response(message)
-        # asyncio.create_task(self._add_action(message))
-        return result
-
     def fail_response(self, message: str) -> ToolResult:
         result = super().fail_response(message)
-        asyncio.create_task(self._add_failure(message))
+        # Failures are queued; one task adds everything queued so far to the workspace at once
+        self._pending_failures.append(message)
+        if self._failure_task is None or self._failure_task.done():
+            self._failure_task = asyncio.get_running_loop().create_task(self._drain_pending_failures())
         return result
 
-    async def _add_failure(self, message: str):
-        workspace = await self.state_manager.get("workspace")
-        if "latest_failures" not in workspace:
-            workspace["latest_failures"] = []
-        workspace["latest_failures"].append(message)
-        await self.state_manager.set("workspace", workspace)
+    async def _drain_pending_failures(self):
+        while self._pending_failures:
+            messages, self._pending_failures = self._pending_failures, []
+            try:
+                await self._add_failures(messages)
+            except StateManagerError as e:
+                logging.warning(f"Could not record failures in the workspace: {e}")
+
+    async def aclose(self):
+        """Record any queued failures and shut down the container connections."""
+        if self._failure_task is not None:
+            await asyncio.gather(self._failure_task, return_exceptions=True)
+        await self._bash_executor.aclose()
+
+    async def _add_failures(self, messages: List[str]):
+        await self._update_workspace(
+            lambda workspace: _append_capped(workspace["latest_failures"], *messages),
+            lambda: self.state_manager.extend(("workspace", "latest_failures"), messages, max_length=_MAX_WORKSPACE_LOG)
+        )
 
     async def _add_action(self, message: str):
-        workspace = await self.state_manager.get("workspace")
         # Ensure actions_taken is initialized
-        if "actions_taken" not in workspace:
-            workspace["actions_taken"] = []
-        workspace["actions_taken"].append(
-            message
+        await self._update_workspace(
+            lambda workspace: _append_capped(workspace["actions_taken"], message),
+            lambda: self.state_manager.append(("workspace", "actions_taken"), message, max_length=_MAX_WORKSPACE_LOG)
         )
-        await self.state_manager.set("workspace", workspace)
 
     @openapi_schema({
         "type": "function",
@@ -784,18 +1171,23 @@ print("Hello, World!")
     )
     async def open_file(self, path: str) -> ToolResult:
         """Add a file to the workspace to view its content."""
+        if not isinstance(path, str) or not path:
+            return self.fail_response(f"Error adding file {path} to workspace: please provide a valid file path. You may use view_folder to explore the folder structure.")
+
+        def add_file(workspace):
+            if path in workspace["open_files"]:
+                return False
+            workspace["open_files"][path] = None
+            return True
+
         try:
-            workspace = await self.state_manager.get("workspace")
-            if "open_files" not in workspace:
-                workspace["open_files"] = []
-            if path not in workspace["open_files"]:
-                workspace["open_files"].append(path)
-                await self.state_manager.set("workspace", workspace)
-                return self.success_response(f"File {path} added to workspace.")
-            else:
-                return self.success_response(f"File {path} is already open in the workspace.")
-        except Exception as e:
+            added = await self._update_workspace(add_file)
+        except StateManagerError as e:
             return self.fail_response(f"Error adding file {path} to workspace: {str(e)}, please provide a valid file path. You may use view_folder to explore the folder structure.")
+        if added:
+            return self.success_response(f"File {path} added to workspace.")
+        else:
+            return self.success_response(f"File {path} is already open in the workspace.")
 
     @openapi_schema({
         "type": "function",
@@ -862,15 +1254,28 @@ print("Hello, World!")
     )
     async def track_implementation(self, id: str, status: str, note: Optional[str] = None) -> ToolResult:
         """Track implementation trials with IDs, statuses, and optional notes."""
+        if not isinstance(id, str) or not id:
+            return self.fail_response(f"Error tracking implementation trial '{id}': the id must be a non-empty string.")
+
+        def update_trial(workspace):
+            trials = workspace["implementation_trials"]
+            trial = trials.get(id)
+            if trial is None:
+                trials[id] = {"status": status, "note": note or ""}
+            else:
+                # Status-only updates keep the trial's note
+                trial["status"] = status
+                if note is not None:
+                    trial["note"] = note
+
+        # A given note replaces the whole trial, which can be stored at its path directly
+        persist = None
+        if note is not None:
+            persist = lambda: self.state_manager.set_path(
+                ("workspace", "implementation_trials", id), {"status": status, "note": note}
+            )
         try:
-            workspace = await self.state_manager.get("workspace")
-            if "implementation_trials" not in workspace:
-                workspace["implementation_trials"] = {}
-            workspace["implementation_trials"][id] = {
-                "status": status,
-                "note": note or ""
-            }
-            await self.state_manager.set("workspace", workspace)
-            return self.success_response(f"Implementation trial '{id}' status updated to '{status}'.")
-        except Exception as e:
-            return self.fail_response(f"Error tracking implementation trial '{id}': {str(e)}")
\ No newline at end of file
+            await self._update_workspace(update_trial, persist)
+        except StateManagerError as e:
+            return self.fail_response(f"Error tracking implementation trial '{id}': {str(e)}")
+        return self.success_response(f"Implementation trial '{id}' status updated to '{status}'.")
\ No newline at end of file
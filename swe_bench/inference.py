@@ -358,10 +358,14 @@ def main():
             threads_dir = os.path.join(args.output_dir, instance_dir, 'threads')
             if os.path.exists(threads_dir):
                 for file_name in os.listdir(threads_dir):
-                    if file_name.endswith('_history.json'):
+                    if file_name.endswith('_history.ndjson'):
                         src_file = os.path.join(threads_dir, file_name)
                         dest_file = os.path.join(trajs_dir, f'{instance_dir}.json')
-                        shutil.copy(src_file, dest_file)
+                        # History files are newline-delimited JSON; submit them as a single document
+                        with open(src_file, 'r') as f:
+                            messages = [json.loads(line) for line in f if line.strip()]
+                        with open(dest_file, 'w') as f:
+                            json.dump({"messages": messages}, f)
                         print(f"Copied trajectory for instance {instance_dir} to {dest_file}")
                         break
             else:
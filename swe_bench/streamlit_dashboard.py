@@ -51,13 +51,14 @@ def load_thread_data(run_dir: str) -> List[Dict]:
     thread_data = []
     if os.path.exists(threads_dir):
         # First look for history files
-        history_files = [f for f in os.listdir(threads_dir) if f.endswith('_history.json')]
+        history_files = [f for f in os.listdir(threads_dir) if f.endswith('_history.ndjson')]
         if history_files:
             # Sort history files to maintain order
             for file in sorted(history_files):
                 try:
+                    # History files are newline-delimited JSON, one message per line
                     with open(os.path.join(threads_dir, file), 'r') as f:
-                        thread_data.append(json.load(f))
+                        thread_data.append({"messages": [json.loads(line) for line in f if line.strip()]})
                 except json.JSONDecodeError:
                     st.warning(f"Failed to decode JSON from {file}")
         else:
@@ -98,6 +99,8 @@ def format_message_content(content):
                 formatted_content.append(item['text'])
             elif item.get('type') == 'image_url':
                 formatted_content.append(f"![Image]({item['url']})")
+            elif item.get('type') == 'image_ref':
+                formatted_content.append(f"![Image]({item['path']})")
         return "\n".join(formatted_content)
     return str(content)
 